@@ -0,0 +1,54 @@
+# -*- coding: UTF-8 -*-
+"""
+持久化缓存：数据保存在 SQLite 中，进程重启后仍然有效，前面再加一层内存中的 LRU
+"""
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class KVCache:
+    # 以字符串为 key、以 JSON 为 value 的缓存，多个进程可以共用同一个 SQLite 文件
+    def __init__(self, path, name, lru_size=100000):
+        self.name = name
+        self.lru_size = lru_size
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(f'CREATE TABLE IF NOT EXISTS {name} (key TEXT PRIMARY KEY, value TEXT)')
+        self._conn.commit()
+
+    def _remember(self, key, value):
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get(self, key):
+        # 不存在时返回 None
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                return self._lru[key]
+            row = self._conn.execute(f'SELECT value FROM {self.name} WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            value = json.loads(row[0])
+            self._remember(key, value)
+            return value
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, items: dict):
+        with self._lock:
+            self._conn.executemany(f'INSERT OR REPLACE INTO {self.name} (key, value) VALUES (?, ?)',
+                                   [(k, json.dumps(v)) for k, v in items.items()])
+            self._conn.commit()
+            for k, v in items.items():
+                self._remember(k, v)
+
+    def close(self):
+        self._conn.close()
@@ -4,10 +4,14 @@ ETL 参数解析，以及 Web3 初始化
 @Time    : 2021/3/13 7:28 下午
 @Author  : zhangguanghui
 """
+import web3
 import logging
 import argparse
 import configparser
 from pathlib import Path
+from util import TOPIC_TRANSFER
+from pool import endpoint_kind
+from events import EVENTS
 
 __all__ = ['conf']
 
@@ -16,22 +20,71 @@ logging.basicConfig(level=logging.INFO,
 logger = logging.getLogger(__name__)
 
 
+# 跟踪模式下默认的结束区块
+FOLLOW_END = 10 ** 10 - 1
+
+
+def split_list(value, formatter=str):
+    # 逗号分隔的列表，为空时返回 None
+    items = [i.strip() for i in (value or '').split(',') if i.strip()]
+    return [formatter(i) for i in items] or None
+
+
 def combine_config(c, a):
     # 合并配置项
     return {
-        # geth.ipc
-        'ipc': c['geth']['ipc'],
+        # geth.ipc，也可以是 http(s):// 或 ws(s):// 地址；多个节点用逗号分隔
+        'ipc': split_list(c['geth']['ipc']),
+        'pool_size': c.getint('geth', 'pool_size', fallback=6),
+        'max_lag': c.getint('geth', 'max_lag', fallback=5),
+        'rpc_batch': c.getint('geth', 'rpc_batch', fallback=100),
+        'receipt_workers': c.getint('geth', 'receipt_workers', fallback=4),
+        'log_max_window': c.getint('geth', 'log_max_window', fallback=2000),
+        'log_target': c.getint('geth', 'log_target', fallback=5000),
         # input
         'start': a.start,
-        'end': a.end,
+        # 跟踪模式下不指定结束区块时一直运行
+        'end': a.end if a.end is not None else FOLLOW_END,
         # output
         'output': c['output']['path'],
         'format': c['output']['format'],
         'compression': None if c['output']['compression'] == 'None' else c['output']['compression'],
-        'batch': a.batch or c.getint('output', 'batch'),
+        # 跟踪模式下每个文件只包含 micro_batch 个区块
+        'batch': a.batch or (c.getint('follow', 'micro_batch', fallback=10) if a.follow
+                             else c.getint('output', 'batch')),
+        'chunk_size': c.getint('output', 'chunk_size', fallback=10000),
+        # encoding = binary 时 parquet 中的 hash、address 等列保存为原始字节
+        'encoding': c.get('output', 'encoding', fallback='hex'),
+        # layout = hive 时按 start_block=<分区> 目录输出，每个分区包含 partition_size 个区块
+        'layout': c.get('output', 'layout', fallback='flat'),
+        'partition_size': (c.getint('output', 'partition_size', fallback=100000)
+                           if c.get('output', 'layout', fallback='flat') == 'hive' else None),
         **{key: value for key, value in c['output'].items() if key.startswith('table_name')},
+        # logs 过滤条件，在节点上完成过滤
+        'logs_topics': split_list(c.get('logs', 'logs_topics', fallback=None), str.lower),
+        'logs_addresses': split_list(c.get('logs', 'logs_addresses', fallback=None), web3.Web3.toChecksumAddress),
+        'token_topics': split_list(c.get('logs', 'token_topics', fallback=TOPIC_TRANSFER), str.lower),
+        'token_addresses': split_list(c.get('logs', 'token_addresses', fallback=None), web3.Web3.toChecksumAddress),
+        # cache
+        'cache': c.get('cache', 'path', fallback='cache'),
+        'cache_lru_size': c.getint('cache', 'lru_size', fallback=100000),
+        # 配置中新增的合约标准
+        'standards': dict(c['standards']) if c.has_section('standards') else {},
+        # 配置中新增的事件，以及需要解码输出的事件（默认不解码）
+        'events': {k: v for k, v in c['events'].items() if k != 'decode'} if c.has_section('events') else {},
+        'decode_events': split_list(c.get('events', 'decode', fallback=None)) or [],
         # action
         'continue': c.getboolean('action', 'continue'),
+        'workers': c.getint('action', 'workers', fallback=1),
+        # follow：区间的最后一个区块之后还需要出 confirmations 个区块才开始处理，非跟踪模式下与原来一样为 1
+        'follow': a.follow,
+        'confirmations': c.getint('follow', 'confirmations', fallback=6) if a.follow else 1,
+        'reorg_window': c.getint('follow', 'reorg_window', fallback=128),
+        # metrics：每处理完一个区间输出一次运行指标，None 表示不输出；profile 为 None 表示不做性能分析
+        'metrics_format': None if c.get('metrics', 'format', fallback='None') == 'None' else c['metrics']['format'],
+        'metrics_path': c.get('metrics', 'path', fallback='metrics'),
+        'profile': None if c.get('metrics', 'profile', fallback='None') == 'None' else c['metrics']['profile'],
+        'profile_batch': c.getint('metrics', 'profile_batch', fallback=1),
     }
 
 
@@ -50,26 +103,61 @@ config.read(path_config)
 # 读取入参
 parser = argparse.ArgumentParser()
 parser.add_argument('--start', '-s', required=True, type=int, help='开始区块高度')
-parser.add_argument('--end', '-e', required=True, type=int, help='结束区块高度')
+parser.add_argument('--end', '-e', type=int, help='结束区块高度，跟踪模式下可以不指定')
 parser.add_argument('--batch', '-b', type=int, help='输出到一个文件中的区块数')
+parser.add_argument('--follow', '-f', action='store_true', help='跟踪模式：持续输出最新确认的区块，每个文件只包含少量区块')
 args = parser.parse_args()
+if args.end is None and not args.follow:
+    parser.error('非跟踪模式下必须指定结束区块高度 --end')
 
 # 合并配置项
 conf = combine_config(config, args)
 print_config(conf)
 
 # 检查 ipc
-path_ipc = conf['ipc']
-assert Path(path_ipc).name == 'geth.ipc', 'config.ini 中的 geth.ipc 文件名错误'
-assert Path(path_ipc).exists(), f'config.ini 中的 geth.ipc 文件不存在：{path_ipc}'
+assert conf['ipc'], 'config.ini 中没有配置 geth.ipc'
+for path_ipc in conf['ipc']:
+    if endpoint_kind(path_ipc) == 'ipc':
+        assert Path(path_ipc).name == 'geth.ipc', 'config.ini 中的 geth.ipc 文件名错误'
+        assert Path(path_ipc).exists(), f'config.ini 中的 geth.ipc 文件不存在：{path_ipc}'
+assert conf['max_lag'] >= 0, '节点允许落后的区块数 max_lag 不能小于 0'
+assert 0 < conf['pool_size'] <= 256, '每个节点的连接数 pool_size 不在合理范围 (0, 256]'
+assert 0 < conf['rpc_batch'] <= 10000, '一个 JSON-RPC batch 中的请求数不在合理范围 (0, 10000]'
+assert 0 < conf['receipt_workers'] <= 64, '获取 receipts 的线程数不在合理范围 (0, 64]'
+assert conf['log_max_window'] > 0 and conf['log_target'] > 0, 'log_max_window 和 log_target 必须大于 0'
 # 检查 output
 dir_output = Path(conf['output'])
 dir_output = dir_output if dir_output.is_absolute() else (Path(__file__).parent / dir_output)
 dir_output.mkdir(exist_ok=True)
+dir_cache = Path(conf['cache'])
+dir_cache = dir_cache if dir_cache.is_absolute() else (Path(__file__).parent / dir_cache)
+dir_cache.mkdir(exist_ok=True)
+conf['cache'] = str(dir_cache)
+dir_metrics = Path(conf['metrics_path'])
+dir_metrics = dir_metrics if dir_metrics.is_absolute() else (Path(__file__).parent / dir_metrics)
+conf['metrics_path'] = str(dir_metrics)
+assert conf['metrics_format'] in ['prometheus', 'jsonl', None], '指标格式 metrics.format 仅支持 prometheus、jsonl 或 None'
+assert conf['profile'] in ['cprofile', 'pyinstrument', None], '性能分析 metrics.profile 仅支持 cprofile、pyinstrument 或 None'
+assert conf['profile_batch'] > 0, '进行性能分析的区间序号 profile_batch 必须大于 0'
+assert conf['cache_lru_size'] > 0, '内存缓存的条目数 lru_size 必须大于 0'
 assert conf['format'] in ['csv', 'parquet'], f'不支持自定义格式 {conf["format"]}，仅支持 csv 或 parquet'
 valid_comps = {'snappy', 'gzip', 'brotli', None}
 assert conf['format'] != 'parquet' or conf['compression'] in valid_comps, f'parquet 格式下，压缩方式仅支持 {valid_comps}'
 # 检查区块高度
 assert 0 <= conf['start'] <= conf['end'], '开始或结束区块高度异常'
 assert 0 < conf['batch'] <= 10000, '一个文件中的区块高度不在合理范围 (0, 10000]'
-assert (conf['end'] - conf['start'] + 1) % conf['batch'] == 0, '总区块数量要能够被 batch 整除'
+assert conf['follow'] or (conf['end'] - conf['start'] + 1) % conf['batch'] == 0, '总区块数量要能够被 batch 整除'
+assert conf['confirmations'] >= 0, '确认区块数 confirmations 不能小于 0'
+assert conf['reorg_window'] > 0, '检测分叉的窗口 reorg_window 必须大于 0'
+assert 0 < conf['workers'] <= 64, '工作进程数 workers 不在合理范围 (0, 64]'
+assert conf['encoding'] in ['hex', 'binary'], f'不支持的编码 {conf["encoding"]}，仅支持 hex 或 binary'
+assert conf['encoding'] == 'hex' or conf['format'] == 'parquet', 'encoding = binary 只支持 parquet 格式'
+assert conf['layout'] in ['flat', 'hive'], f'不支持的输出布局 {conf["layout"]}，仅支持 flat 或 hive'
+assert conf['partition_size'] is None or conf['partition_size'] % conf['batch'] == 0, \
+    '分区的区块数 partition_size 要能够被 batch 整除'
+assert conf['chunk_size'] > 0, '写入文件的分块行数 chunk_size 必须大于 0'
+# 检查 events
+for event_name in conf['decode_events']:
+    assert event_name in {**EVENTS, **conf['events']}, f'events.decode 中的事件 {event_name} 未定义'
+    assert not conf['events'].get(event_name, '').endswith('.json') or Path(conf['events'][event_name]).exists(), \
+        f'事件 {event_name} 的 ABI 文件不存在：{conf["events"][event_name]}'
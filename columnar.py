@@ -0,0 +1,95 @@
+# -*- coding: UTF-8 -*-
+"""
+列式转换：把 blocks、transactions、logs 和 token_transfers 直接转换成有类型的 Arrow 列
+不再为每一行构造 dict，也不需要在写入时推断 schema，schema 由 schemas.py 中的登记得到
+hash 等字节类型的列直接传入原始值，由 schemas.py 按 encoding 转换为 hex 字符串或字节
+"""
+from util import TOPIC_TRANSFER, word_to_address
+from schemas import get_schema, to_table
+
+
+def to_hex(value):
+    # 与 HexBytes.hex() 的结果相同
+    return None if value is None else '0x' + bytes.hex(value)
+
+
+def to_lower(value):
+    return value.lower() if isinstance(value, str) else value
+
+
+def blocks_to_table(blocks):
+    blocks = list(blocks)
+    return to_table(get_schema('blocks'), [
+        [i.get('number') for i in blocks],
+        [i.get('hash') for i in blocks],
+        [i.get('parentHash') for i in blocks],
+        [i.get('nonce') for i in blocks],
+        [i.get('sha3Uncles') for i in blocks],
+        [i.get('logsBloom') for i in blocks],
+        [i.get('transactionsRoot') for i in blocks],
+        [i.get('stateRoot') for i in blocks],
+        [i.get('receiptsRoot') for i in blocks],
+        [i.get('miner') for i in blocks],
+        [i.get('difficulty') for i in blocks],
+        [i.get('totalDifficulty') for i in blocks],
+        [i.get('size') for i in blocks],
+        [i.get('proofOfAuthorityData') for i in blocks],
+        [i.get('gasLimit') for i in blocks],
+        [i.get('gasUsed') for i in blocks],
+        [i.get('timestamp') for i in blocks],
+        [len(i.get('transactions')) for i in blocks],
+    ])
+
+
+def transactions_to_table(blocks):
+    # blocks 需要包含完整的 transactions，block_timestamp 取自所在的区块
+    txs = [j for i in blocks for j in i.get('transactions')]
+    timestamps = [i.get('timestamp') for i in blocks for _ in i.get('transactions')]
+    return to_table(get_schema('transactions'), [
+        [i.get('hash') for i in txs],
+        [i.get('nonce') for i in txs],
+        [i.get('blockHash') for i in txs],
+        [i.get('blockNumber') for i in txs],
+        [i.get('transactionIndex') for i in txs],
+        [to_lower(i.get('from')) for i in txs],
+        [to_lower(i.get('to')) for i in txs],
+        [i.get('value') for i in txs],
+        [i.get('gas') for i in txs],
+        [i.get('gasPrice') for i in txs],
+        [i.get('input') for i in txs],
+        timestamps,
+    ])
+
+
+def logs_to_table(logs):
+    logs = list(logs)
+    return to_table(get_schema('logs'), [
+        [i.get('logIndex') for i in logs],
+        [i.get('transactionHash') for i in logs],
+        [i.get('transactionIndex') for i in logs],
+        [i.get('blockHash') for i in logs],
+        [i.get('blockNumber') for i in logs],
+        [to_lower(i.get('address')) for i in logs],
+        [i.get('data') for i in logs],
+        # 一条 log 最多有 4 个 topic（LOG0~LOG4），分别保存为 topic0~topic3，没有的为空
+        *[[i.get('topics')[k] if len(i.get('topics')) > k else None for i in logs] for k in range(4)],
+    ])
+
+
+def is_transfer(log):
+    topics = log.get('topics')
+    return bool(topics) and to_hex(topics[0]).startswith(TOPIC_TRANSFER)
+
+
+def transfers_to_table(transfers):
+    transfers = list(transfers)
+    topics = [[to_hex(j) for j in i.get('topics')] for i in transfers]
+    return to_table(get_schema('token_transfers'), [
+        [to_lower(i.get('address')) for i in transfers],
+        [word_to_address(i[1]) if len(i) > 1 else None for i in topics],
+        [word_to_address(i[2]) if len(i) > 2 else None for i in topics],
+        [int(i.get('data'), 16) if i.get('data') != '0x' else 0 for i in transfers],
+        [i.get('transactionHash') for i in transfers],
+        [i.get('logIndex') for i in transfers],
+        [i.get('blockNumber') for i in transfers],
+    ])
@@ -0,0 +1,241 @@
+# -*- coding: UTF-8 -*-
+"""
+合并小文件：layout = hive 时，把每个已完成分区（start_block=<分区> 目录）中的 parquet 小文件按顺序合并成
+接近 target_size 的大文件，查询引擎打开的文件数随之减少
+只合并清单中所有区间都已完成、且在最新的 reorg_window 个区块之前的分区，不会与正在运行的导出或分叉重写冲突
+合并后的文件先原子地写入，再删除被合并的小文件；中途中断时，下一次运行会删除已被合并后的文件包含的（比它旧的）小文件
+合并之后又重新输出的小文件（比合并后的文件新）不会被删除，而是替换合并后的文件中同一区间的行
+"""
+import os
+import re
+import logging
+import argparse
+import configparser
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pathlib import Path
+from manifest import Manifest
+from util import TableWriter
+from standards import register_standards
+from events import register_events, event_tables
+from logindex import write_index, remove_index, split_topics
+from schemas import TABLES, get_schema, logical_type, to_array, set_encoding
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(filename)s[line:%(lineno)d] - %(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+PATTERN = re.compile(r'^(\w+)_(\d+)_(\d+)\.parquet$')
+# 类型不同时需要逐个值转换的逻辑类型
+CONVERTIBLE = ('uint256', 'hash', 'address', 'bytes')
+
+
+def list_files(dir_partition, table):
+    # 分区中的数据文件 [(开始区块, 结束区块, 路径), ...]，按开始区块排序
+    files = []
+    for name in os.listdir(dir_partition):
+        m = PATTERN.match(name)
+        if m and m.group(1) == table:
+            files.append((int(m.group(2)), int(m.group(3)), os.path.join(dir_partition, name)))
+    return sorted(files)
+
+
+def block_column(table):
+    return 'number' if table == 'blocks' else 'block_number'
+
+
+def remove_covered(table, files, compression=None, chunk_size=10000):
+    # 小文件的区间被合并后的文件包含时：
+    # - 小文件比合并后的文件旧，说明上一次合并在删除小文件之前中断，删除这些小文件
+    # - 小文件比合并后的文件新，说明合并之后又重新输出了该区间（如 continue = False），用小文件中的行替换合并后的文件中
+    #   同一区间的行，不能删除新的数据
+    result, newer = [], {}
+    for start_block, end_block, path in files:
+        covers = [(s, e, p) for s, e, p in files
+                  if s <= start_block and end_block <= e and (s, e) != (start_block, end_block)]
+        if not covers:
+            result.append((start_block, end_block, path))
+            continue
+        cover = max(covers, key=lambda i: i[1] - i[0])
+        if os.path.getmtime(path) > os.path.getmtime(cover[2]):
+            newer.setdefault(cover[2], []).append((start_block, end_block, path))
+        else:
+            logger.warning(f'{path} 已被合并到其他文件中，删除')
+            remove_index(path)
+            os.remove(path)
+    for path, items in newer.items():
+        refresh(table, path, items, compression, chunk_size)
+    return result
+
+
+def refresh(table, path, newer, compression=None, chunk_size=10000):
+    # 用 newer（合并后重新输出的小文件）中的行替换合并后的文件 path 中同一区间的行，再删除这些小文件
+    column = block_column(table)
+    paths = [p for _, _, p in newer]
+    schema = merge_schema(table, [read_schema(i) for i in [path] + paths])
+    if table == 'tokens' or column not in schema.names:
+        raise ValueError(f'{path} 合并之后又重新输出了 {paths}，{table} 中没有区块高度，无法替换其中的行，'
+                         f'请确认后手动删除其中一方')
+    data = conform(split_topics(pq.read_table(path)), schema)
+    keep = pa.array([True] * data.num_rows)
+    for start_block, end_block, _ in newer:
+        in_range = pc.and_(pc.greater_equal(data.column(column), start_block),
+                           pc.less_equal(data.column(column), end_block))
+        keep = pc.and_(keep, pc.invert(pc.fill_null(in_range, False)))
+    data = pa.concat_tables([data.filter(keep)] + [conform(split_topics(pq.read_table(i)), schema) for i in paths])
+    # 排序是稳定的，同一区块内的行保持原来的顺序
+    data = data.take(pc.sort_indices(data, sort_keys=[(column, 'ascending')]))
+    remove_index(path)
+    with TableWriter(path, 'parquet', compression, schema=schema) as writer:
+        for batch in data.to_batches(max_chunksize=chunk_size):
+            writer.write_table(pa.Table.from_batches([batch], schema=schema))
+    if table == 'logs':
+        write_index(path, data)
+    for i in paths:
+        remove_index(i)
+        os.remove(i)
+    logger.warning(f'{table}: {path} 合并之后又重新输出了 {len(paths)} 个文件，已替换其中的行')
+
+
+def group_files(files, target_size):
+    # 按顺序把相邻的文件分组，每组的文件大小之和不超过 target_size，单个文件超过 target_size 时单独一组
+    groups, group, size = [], [], 0
+    for item in files:
+        file_size = os.path.getsize(item[2])
+        if group and size + file_size > target_size:
+            groups.append(group)
+            group, size = [], 0
+        group.append(item)
+        size += file_size
+    if group:
+        groups.append(group)
+    return groups
+
+
+def merge_schema(table, schemas):
+    # schemas.py 中登记过的表以登记的 schema 为准，旧文件中多出的列放在最后
+    # 其他列的类型由数据推断，全为空的列被推断为字符串，与其他文件中同名列的类型不同时，以其他文件中的类型为准
+    fields = {i.name: i for i in get_schema(table)} if table in TABLES else {}
+    registered = set(fields)
+    for schema in schemas:
+        for field in schema:
+            if field.name in registered:
+                continue
+            if field.name not in fields or pa.types.is_string(fields[field.name].type):
+                fields[field.name] = field
+    return pa.schema(list(fields.values()))
+
+
+def conform(data, schema):
+    # 转换为相同的 schema：旧文件中没有的列填充为空，旧版本中以十进制字符串保存的 uint256 转换为 32 字节，
+    # 修改 encoding 前后输出的 hash 等列转换为当前的 encoding
+    columns = []
+    for field in schema:
+        if field.name not in data.column_names:
+            columns.append(pa.nulls(data.num_rows, field.type))
+        elif data.schema.field(field.name).type != field.type and logical_type(field) in CONVERTIBLE:
+            columns.append(to_array(data.column(field.name).to_pylist(), field))
+        else:
+            columns.append(data.column(field.name).cast(field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def read_schema(path):
+    # 旧版本的 logs 中所有 topic 保存在 topics 一列中，合并时拆分为 topic0~topic3
+    schema = pq.read_schema(path)
+    return schema.remove(schema.get_field_index('topics')) if 'topics' in schema.names else schema
+
+
+def iter_tables(paths, schema, chunk_size):
+    # 逐个读取文件并转换为相同的 schema，再重新切分成 chunk_size 行的分块，
+    # 使合并后文件的 row group 不会因为原来的文件太小而太小
+    buffer = schema.empty_table()
+    for path in paths:
+        buffer = pa.concat_tables([buffer, conform(split_topics(pq.read_table(path)), schema)])
+        while buffer.num_rows >= chunk_size:
+            yield buffer.slice(0, chunk_size)
+            buffer = buffer.slice(chunk_size)
+    yield buffer
+
+
+def merge(table, group, compression, chunk_size):
+    # 把一组相邻的文件合并为一个文件，返回合并后的路径
+    paths = [path for _, _, path in group]
+    schema = merge_schema(table, [read_schema(path) for path in paths])
+    path = os.path.join(os.path.dirname(paths[0]), f'{table}_{group[0][0]:08d}_{group[-1][1]:08d}.parquet')
+    remove_index(path)
+    with TableWriter(path, 'parquet', compression, schema=schema) as writer:
+        for data in iter_tables(paths, schema, chunk_size):
+            writer.write_table(data)
+    if table == 'logs':
+        write_index(path, pq.read_table(path, columns=['address', 'topic0']))
+    for i in paths:
+        remove_index(i)
+        os.remove(i)
+    logger.info(f'{table}: {len(paths)} 个文件 -> {path}')
+    return path
+
+
+def compact(output, table, partition_size, target_size, compression=None, chunk_size=10000, reorg_window=128):
+    # 合并一张表的所有已完成分区，返回合并后的文件数
+    dir_table = os.path.join(output, table)
+    manifest = Manifest(output)
+    progress = manifest.progress().get(table)
+    merged = 0
+    if progress is None or not os.path.isdir(dir_table):
+        logger.info(f'{table} 尚未处理')
+        return merged
+    for name in sorted(os.listdir(dir_table)):
+        m = re.match(r'^start_block=(\d+)$', name)
+        if not m:
+            continue
+        start_block = int(m.group(1))
+        end_block = start_block + partition_size - 1
+        first_block = max(start_block, progress['min_block'])
+        if end_block > progress['max_block'] - reorg_window or \
+                manifest.blocks_done(table, start_block, end_block) < end_block - first_block + 1:
+            logger.info(f'{table} 的分区 {name} 尚未完成，跳过')
+            continue
+        try:
+            files = remove_covered(table, list_files(os.path.join(dir_table, name), table), compression, chunk_size)
+        except ValueError as err:
+            # 无法自动处理的分区保留原样，不影响其他分区
+            logger.error(f'{table} 的分区 {name} 跳过：{err}')
+            continue
+        for group in group_files(files, target_size):
+            if len(group) > 1:
+                merge(table, group, compression, chunk_size)
+                merged += 1
+    manifest.close()
+    return merged
+
+
+if __name__ == '__main__':
+    path_config = Path(__file__).parent / 'config.ini'
+    assert path_config.exists(), '配置文件 config.ini 不存在'
+    config = configparser.ConfigParser()
+    config.read(path_config)
+    if config.has_section('standards'):
+        register_standards(dict(config['standards']))
+    set_encoding(config.get('output', 'encoding', fallback='hex'))
+    if config.has_section('events'):
+        register_events({k: v for k, v in config['events'].items() if k != 'decode'},
+                        [i.strip() for i in config.get('events', 'decode', fallback='').split(',') if i.strip()])
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tables', '-t', default=','.join(list(TABLES) + event_tables()),
+                        help='需要合并的表，逗号分隔，默认为全部 7 张表和需要解码的事件表')
+    parser.add_argument('--target-size', type=int, help='合并后每个文件的目标大小（MB），默认为 config.ini 中的 target_file_size')
+    args = parser.parse_args()
+
+    dir_output = config['output']['path']
+    assert config.get('output', 'layout', fallback='flat') == 'hive', '只有 layout = hive 时才能合并文件'
+    assert config['output']['format'] == 'parquet', '只支持合并 parquet 格式的文件'
+    target_size = (args.target_size or config.getint('output', 'target_file_size', fallback=256)) * 1024 * 1024
+    compression = None if config['output']['compression'] == 'None' else config['output']['compression']
+    for table_name in [i.strip() for i in args.tables.split(',') if i.strip()]:
+        count = compact(dir_output, table_name, config.getint('output', 'partition_size', fallback=100000),
+                        target_size, compression, config.getint('output', 'chunk_size', fallback=10000),
+                        config.getint('follow', 'reorg_window', fallback=128))
+        print(f'{table_name} 合并后生成了 {count} 个文件')
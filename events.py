@@ -0,0 +1,253 @@
+# -*- coding: UTF-8 -*-
+"""
+事件解码：按 topic0 和 topic 的个数把 logs 分发给登记的事件，每种事件输出一张表 event_<事件名>
+内置 ERC20、ERC721、ERC1155 的常用事件（ERC20 与 ERC721 的 Transfer 的 topic0 相同，靠 topic 的个数区分），
+在 config.ini 的 [events] 中可以新增事件（事件签名或 ABI 文件），只有 decode 中列出的事件才会解码并输出
+分发使用预先计算好的 {(topic0, topic 个数): 事件} 哈希表，每个 log 只查找一次；
+同一事件的 logs 按列一起解码：indexed 参数取自各 topic，非 indexed 的静态参数按 32 字节切分 data，
+只有含动态类型（bytes、string、数组）参数的事件才逐个调用 eth_abi 解码
+"""
+import re
+import json
+import logging
+import eth_abi
+from hexbytes import HexBytes
+from eth_utils import keccak
+from schemas import make_schema, to_table
+
+logger = logging.getLogger(__name__)
+
+# eth_abi 4 以后没有 decode_abi，改名为 decode
+decode_abi = getattr(eth_abi, 'decode_abi', None) or eth_abi.decode
+
+# 事件名 -> 事件签名，indexed 参数需要标注；参数名与 token_transfers 一致，并避开 from、to 等 SQL 关键字
+EVENTS = {
+    'erc20_transfer': 'Transfer(address indexed from_address, address indexed to_address, uint256 value)',
+    'erc20_approval': 'Approval(address indexed owner, address indexed spender, uint256 value)',
+    'erc721_transfer': 'Transfer(address indexed from_address, address indexed to_address, uint256 indexed token_id)',
+    'erc721_approval': 'Approval(address indexed owner, address indexed approved, uint256 indexed token_id)',
+    'approval_for_all': 'ApprovalForAll(address indexed owner, address indexed operator, bool approved)',
+    'erc1155_transfer_single': 'TransferSingle(address indexed operator, address indexed from_address, '
+                               'address indexed to_address, uint256 token_id, uint256 amount)',
+    'erc1155_transfer_batch': 'TransferBatch(address indexed operator, address indexed from_address, '
+                              'address indexed to_address, uint256[] token_ids, uint256[] amounts)',
+}
+
+# 每张事件表都有的列
+BASE_COLUMNS = [
+    ('block_number', 'int'),
+    ('transaction_hash', 'hash'),
+    ('log_index', 'int'),
+    ('contract_address', 'address'),
+]
+
+STATIC = re.compile(r'^(u?int\d+|address|bool|bytes\d+)$')
+INTEGER = re.compile(r'^(u?)int(\d+)$')
+
+
+def canonical(type_):
+    # uint、int 是 uint256、int256 的简写，计算 topic0 时必须使用完整的类型名
+    return re.sub(r'^(u?int)(?=$|\[)', r'\g<1>256', type_.strip())
+
+
+def parse_signature(signature):
+    # 'Deposit(address indexed dst, uint256 wad)' -> ('Deposit', [('dst', 'address', True), ('wad', 'uint256', False)])
+    m = re.match(r'^\s*(\w+)\s*\((.*)\)\s*$', signature)
+    if not m:
+        raise ValueError(f'错误的事件签名 {signature}')
+    params = []
+    for i, item in enumerate([j.split() for j in m.group(2).split(',') if j.strip()]):
+        names = [j for j in item[1:] if j != 'indexed']
+        params.append((names[0] if names else f'arg{i}', canonical(item[0]), 'indexed' in item[1:]))
+    return m.group(1), params
+
+
+def parse_abi(path):
+    # ABI 文件（或 truffle、hardhat 编译输出的含 abi 的 JSON）中所有非匿名的事件 -> [(事件名, 参数)]
+    with open(path) as f:
+        abi = json.load(f)
+    abi = abi['abi'] if isinstance(abi, dict) else abi
+    result = []
+    for item in abi:
+        if item.get('type') != 'event' or item.get('anonymous'):
+            continue
+        if any(i['type'].startswith('tuple') for i in item['inputs']):
+            logger.warning(f'{path} 中的事件 {item["name"]} 含有 tuple 类型的参数，暂不支持解码')
+            continue
+        result.append((item['name'], [(i['name'] or f'arg{k}', canonical(i['type']), i.get('indexed', False))
+                                      for k, i in enumerate(item['inputs'])]))
+    return result
+
+
+def logical_type(type_, indexed=False):
+    # 参数类型 -> schemas.py 中的逻辑类型
+    if indexed and not STATIC.match(type_):
+        # 动态类型的 indexed 参数在 topic 中只保存了它的哈希
+        return 'hash'
+    m = INTEGER.match(type_)
+    if m:
+        bits = int(m.group(2))
+        if m.group(1):
+            return 'int' if bits < 64 else 'uint256'
+        # 超出 BIGINT 范围的有符号整数以十进制字符串保存
+        return 'int' if bits <= 64 else 'string'
+    if type_ in ('address', 'bool', 'string'):
+        return type_
+    if type_.startswith('bytes') and '[' not in type_:
+        return 'bytes'
+    # 数组以 JSON 字符串保存
+    return 'string'
+
+
+def decode_words(words, type_):
+    # 按列解码 32 字节的字（topic 或 data 中的静态参数）
+    if type_ == 'address':
+        return ['0x' + bytes.hex(w[12:]) for w in words]
+    if type_ == 'bool':
+        return [any(w) for w in words]
+    m = INTEGER.match(type_)
+    if m:
+        values = [int.from_bytes(w, 'big', signed=not m.group(1)) for w in words]
+        return [str(i) for i in values] if logical_type(type_) == 'string' else values
+    m = re.match(r'^bytes(\d+)$', type_)
+    if m:
+        return [bytes(w[:int(m.group(1))]) for w in words]
+    # 动态类型的 indexed 参数
+    return [bytes(w) for w in words]
+
+
+def to_json(value):
+    # eth_abi 解码得到的数组 -> 可以 JSON 序列化的值，地址为小写，字节为 hex 字符串
+    if isinstance(value, (list, tuple)):
+        return [to_json(i) for i in value]
+    if isinstance(value, bytes):
+        return '0x' + bytes.hex(value)
+    return value.lower() if isinstance(value, str) and value.startswith('0x') else value
+
+
+def decode_values(values, type_):
+    # 按列转换 eth_abi 解码得到的值
+    logical = logical_type(type_)
+    if logical == 'string' and type_ != 'string':
+        if '[' in type_:
+            return [json.dumps(to_json(i)) for i in values]
+        return [str(i) for i in values]
+    if logical == 'address':
+        return [i.lower() for i in values]
+    return list(values)
+
+
+class Event:
+    def __init__(self, name, event_name, params):
+        self.table = f'event_{name}'
+        base = {i for i, _ in BASE_COLUMNS}
+        # 与公共列同名的参数加上 arg_ 前缀
+        self.params = [(f'arg_{n}' if n in base else n, t, i) for n, t, i in params]
+        self.indexed = [p for p in self.params if p[2]]
+        self.unindexed = [p for p in self.params if not p[2]]
+        self.static = all(STATIC.match(t) for _, t, _ in self.unindexed)
+        self.topic0 = keccak(text=f'{event_name}({",".join(t for _, t, _ in self.params)})')
+        self.schema = make_schema(BASE_COLUMNS + [(n, logical_type(t, i)) for n, t, i in self.params])
+
+    @property
+    def key(self):
+        return self.topic0, len(self.indexed) + 1
+
+    def decode(self, logs):
+        # logs 为 topic0 和 topic 个数都与本事件相同的 logs，data 格式不正确的 log 会被跳过
+        count = len(logs)
+        data = [HexBytes(i.get('data')) for i in logs]
+        types = [t for _, t, _ in self.unindexed]
+        columns = {}
+        if self.static:
+            size = 32 * len(types)
+            valid = [len(d) >= size for d in data]
+            logs = [i for i, ok in zip(logs, valid) if ok]
+            data = [d for d, ok in zip(data, valid) if ok]
+            for k, (name, type_, _) in enumerate(self.unindexed):
+                columns[name] = decode_words([d[32 * k:32 * k + 32] for d in data], type_)
+        else:
+            decoded = []
+            for log, d in zip(logs, data):
+                try:
+                    decoded.append((log, decode_abi(types, d)))
+                except Exception:
+                    continue
+            logs = [i for i, _ in decoded]
+            for k, (name, type_, _) in enumerate(self.unindexed):
+                columns[name] = decode_values([v[k] for _, v in decoded], type_)
+        if len(logs) < count:
+            logger.warning(f'{self.table}: {count - len(logs)} 个 log 的 data 与事件定义不符，已跳过')
+        for k, (name, type_, _) in enumerate(self.indexed):
+            columns[name] = decode_words([i.get('topics')[k + 1] for i in logs], type_)
+        columns.update({
+            'block_number': [i.get('blockNumber') for i in logs],
+            'transaction_hash': [i.get('transactionHash') for i in logs],
+            'log_index': [i.get('logIndex') for i in logs],
+            'contract_address': [i.get('address') for i in logs],
+        })
+        columns['contract_address'] = [i.lower() if isinstance(i, str) else i for i in columns['contract_address']]
+        return to_table(self.schema, [columns[f.name] for f in self.schema])
+
+
+class Decoder:
+    def __init__(self, events):
+        self.events = {}
+        tables = [i.table for i in events]
+        duplicated = sorted({i for i in tables if tables.count(i) > 1})
+        if duplicated:
+            # 不同的事件输出到同一张表时，后写入的会覆盖先写入的文件
+            raise ValueError(f'多个事件输出到同一张表 {", ".join(duplicated)}，请修改 [events] 中的事件名')
+        for event in events:
+            if event.key in self.events:
+                logger.warning(f'{event.table} 与 {self.events[event.key].table} 的 topic0 和 topic 个数都相同，'
+                               f'只解码为 {event.table}')
+            self.events[event.key] = event
+
+    @property
+    def tables(self):
+        return [i.table for i in self.events.values()]
+
+    def decode(self, logs):
+        # 返回 {表名: pyarrow.Table}，没有对应 log 的事件返回空表
+        groups = {key: [] for key in self.events}
+        for log in logs:
+            topics = log.get('topics')
+            if topics:
+                group = groups.get((bytes(topics[0]), len(topics)))
+                if group is not None:
+                    group.append(log)
+        return {event.table: event.decode(groups[key]) for key, event in self.events.items()}
+
+
+decoder = Decoder([])
+
+
+def register_events(events: dict, decode: list):
+    # events 为配置中新增的事件 {事件名: 事件签名或 ABI 文件路径}，decode 为需要解码的事件名
+    # ABI 文件中的每个事件输出为 event_<事件名>_<ABI 中的事件名（小写）>，重载的事件再加上 _<topic0 的前 4 个字节>
+    global decoder
+    definitions = {**EVENTS, **events}
+    registered = []
+    for name in decode:
+        if name not in definitions:
+            raise ValueError(f'未定义的事件 {name}')
+        if definitions[name].endswith('.json'):
+            events = [Event(f'{name}_{i.lower()}', i, params) for i, params in parse_abi(definitions[name])]
+            # 重载的事件（同名但参数不同）再加上 topic0 的前 4 个字节，避免输出到同一张表
+            tables = [i.table for i in events]
+            for event in events:
+                if tables.count(event.table) > 1:
+                    event.table = f'{event.table}_{bytes.hex(event.topic0[:4])}'
+            registered += events
+        else:
+            registered.append(Event(name, *parse_signature(definitions[name])))
+    decoder = Decoder(registered)
+
+
+def event_tables():
+    return decoder.tables
+
+
+def decode_events(logs):
+    return decoder.decode(logs)
@@ -1,48 +1,160 @@
 """
-多线程输出所有数据
+单次遍历输出所有数据：每个区块区间只获取一次 blocks 和 receipts，再分发到 7 张表
+流水线分为 fetch -> transform -> write 三个阶段，下一个区间的 fetch 与当前区间的 transform/write 并行
 @Time    : 2021/3/26 10:25 上午
 @Author  : zhangguanghui
 """
 import os
 import time
-import random
-from util import Web3
-from check_config import conf
-from multiprocessing import Process
-from export_token import export as token_export
-from export_block_tx import export as block_tx_export
-from export_log_trans import export as log_trans_export
-from export_receipt_contract import export as receipt_contract_export
-
-
-def func(target, *args):
-    # 记录进程 ID
-    time.sleep(random.random())
-    with open('pid.txt', 'a') as f:
-        f.write('=.' * 20 + '\n')
-        f.write(f'{target.__module__}({", ".join([str(i) for i in args])})\n')
-        f.write(f'pid: {os.getpid()}\n')
-    # 运行函数
-    target(*args)
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from standards import register_standards
+from util import export_data, wait_until_reach, get_path, get_blocks, get_receipts
+from scheduler import iter_ranges, run
+from manifest import Manifest
+from metrics import metrics, configure as configure_metrics
+from schemas import set_encoding
+from reorg import ReorgDetector
+from logindex import write_index, remove_index
+from events import register_events, event_tables, decode_events
+from columnar import blocks_to_table, transactions_to_table, logs_to_table, transfers_to_table, is_transfer
+from export_token import tokens_to_dicts, get_token_cache
+from export_receipt_contract import receipt_to_dict, contract_to_dict, get_bytecode_cache
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(filename)s[line:%(lineno)d] - %(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+TABLES = ['blocks', 'transactions', 'receipts', 'logs', 'token_transfers', 'contracts', 'tokens']
+
+
+def fetch(web3, config: dict, start_block, end_block):
+    # 获取区间内的 blocks（含 transactions）和 receipts（含 logs），这是访问节点最多的阶段
+    rpc_batch, receipt_workers = config['rpc_batch'], config['receipt_workers']
+    blocks = get_blocks(web3, start_block, end_block, full_transactions=True, batch_size=rpc_batch)
+    transaction_hashes = [j.hash.hex() for i in blocks for j in i.transactions]
+    receipts = get_receipts(web3, transaction_hashes, batch_size=rpc_batch, workers=receipt_workers)
+    return blocks, receipts
+
+
+def transform(web3, blocks, receipts, token_cache=None, bytecode_cache=None, rpc_batch=100):
+    # 把获取到的数据转换成 7 张表，以及配置中需要解码的事件表，contracts 和 tokens 仍需要少量的节点请求
+    logs = [j for i in receipts for j in i.logs]
+    transfers = [i for i in logs if is_transfer(i)]
+    token_addrs = set([i.address for i in transfers])
+    # blocks、transactions、logs、token_transfers 直接转换成 Arrow 列；
+    # receipts 和 contracts 是生成器，在 write 阶段按分块逐步生成；tokens 的元数据在 JSON-RPC batch 中批量获取
+    return {
+        'blocks': blocks_to_table(blocks),
+        'transactions': transactions_to_table(blocks),
+        'receipts': (receipt_to_dict(i) for i in receipts),
+        'logs': logs_to_table(logs),
+        'token_transfers': transfers_to_table(transfers),
+        'contracts': (contract_to_dict(web3, i.contractAddress, i.blockNumber, bytecode_cache)
+                      for i in receipts if i.get('contractAddress')),
+        'tokens': tokens_to_dicts(web3, token_addrs, block_number=None, cache=token_cache, batch_size=rpc_batch),
+        **decode_events(logs),
+    }
+
+
+def write(tables: dict, paths: dict, fmt, compression=None, chunk_size=10000):
+    # 返回每张表写入的行数；logs 文件写完后再写入它的 (address, topic0) 索引
+    remove_index(paths['logs'])
+    rows = {table: export_data(table, tables[table], paths[table], fmt, compression, chunk_size) for table in paths}
+    write_index(paths['logs'], tables['logs'])
+    return rows
+
+
+def export(web3, config: dict):
+    continue_ = config['continue']
+    output, fmt, compression = config['output'], config['format'], config['compression']
+    partition_size = config['partition_size']
+    token_cache, bytecode_cache = get_token_cache(config), get_bytecode_cache(config)
+    manifest = Manifest(output)
+    detector = ReorgDetector(output, config['reorg_window'])
+    register_standards(config['standards'])
+    configure_metrics(config)
+    set_encoding(config['encoding'])
+    register_events(config['events'], config['decode_events'])
+    # 7 张表之外还输出需要解码的事件表
+    tables = TABLES + event_tables()
+    batch, rpc_batch = config['batch'], config['rpc_batch']
+
+    def iter_pending():
+        # 如果设置 continue_=True，且所有表都处理过了，则不重复处理
+        for start_block, end_block in iter_ranges(config):
+            if continue_ and manifest.is_done(tables, start_block, end_block):
+                logger.info(f'区块 {start_block}~{end_block} 已处理，跳过')
+                continue
+            paths = {table: get_path(output, table, start_block, end_block, fmt, partition_size)
+                     for table in tables}
+            yield start_block, end_block, paths
+
+    def timed_fetch(start_block, end_block):
+        started = time.time()
+        with metrics.timer('fetch'):
+            return fetch(web3, config, start_block, end_block), time.time() - started
+
+    def wait_and_fetch(start_block, end_block):
+        # 等待新区块的时间（跟踪模式下大部分时间都在等待）不计入 fetch 的耗时和清单中的耗时
+        wait_until_reach(web3, start_block, batch, config['confirmations'])
+        return timed_fetch(start_block, end_block)
+
+    def process(start_block, end_block, paths, blocks, receipts, seconds):
+        started = time.time()
+        with metrics.timer('transform'):
+            tables = transform(web3, blocks, receipts, token_cache, bytecode_cache, rpc_batch)
+        rows = write(tables, paths, fmt, compression, config['chunk_size'])
+        manifest.add(tables, start_block, end_block, rows, seconds + time.time() - started)
+        detector.add(blocks)
+        metrics.flush(start_block, end_block)
+
+    def rewrite(fork, start_block):
+        # 分叉后的区块已经输出过，按清单重新输出 fork~start_block - 1 涉及的所有区间的所有表，
+        # 这些区间可能是之前的运行（start、batch 不同）输出的，不一定在本次的 start 之后
+        ranges = manifest.ranges('blocks', fork, start_block - 1)
+        if not ranges or ranges[0][0] > fork:
+            logger.error(f'区块 {fork}~{ranges[0][0] - 1 if ranges else start_block - 1} 受分叉影响，'
+                         f'但清单中没有输出它们的区间，无法重新输出，请手动处理')
+        for s, e in ranges:
+            logger.warning(f'区块 {s}~{e} 受分叉影响，重新输出')
+            paths = {table: get_path(output, table, s, e, fmt, partition_size) for table in tables}
+            (blocks, receipts), seconds = timed_fetch(s, e)
+            while detector.check_receipts(blocks, receipts) is not None:
+                (blocks, receipts), seconds = timed_fetch(s, e)
+            process(s, e, paths, blocks, receipts, 0)
+
+    # 预取下一个区间的数据，使节点请求与本地的转换、写入重叠
+    # 记录到清单中的耗时为该区间 fetch 的耗时加上 transform 和 write 的耗时
+    # 需要做性能分析的区间不预取，而是在当前线程中获取，使分析结果包含 fetch 阶段
+    pending = iter_pending()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        current = next(pending, None)
+        future = executor.submit(wait_and_fetch, *current[:2]) if current and not metrics.will_profile() else None
+        while current is not None:
+            with metrics.profile(*current[:2]):
+                (blocks, receipts), seconds = future.result() if future is not None else wait_and_fetch(*current[:2])
+                # 检查分叉：重新输出受影响的区间，并重新获取当前区间，直到当前区间与已输出的区块相连，
+                # 且 receipts 与 blocks 在同一条链上
+                fork = detector.check(web3, blocks, rpc_batch, receipts)
+                while fork is not None:
+                    if fork < current[0]:
+                        rewrite(fork, current[0])
+                    (blocks, receipts), seconds = timed_fetch(*current[:2])
+                    fork = detector.check(web3, blocks, rpc_batch, receipts)
+                following = next(pending, None)
+                future = None
+                if following is not None and not metrics.will_profile():
+                    future = executor.submit(wait_and_fetch, *following[:2])
+                process(*current, blocks, receipts, seconds)
+            current = following
 
 
 if __name__ == '__main__':
+    from check_config import conf
+
     # 生成杀掉进程的脚本
     with open('kill.sh', 'w') as f:
         f.write(f'kill -9 {os.getpid()}')
 
-    w3 = Web3(conf['ipc'])
-
-    ps = []
-    for function in [
-        token_export,
-        block_tx_export,
-        log_trans_export,
-        receipt_contract_export
-    ]:
-        p = Process(target=func, args=(function, w3, conf))
-        p.start()
-        ps.append(p)
-
-    for p in ps:
-        p.join()
+    run(export, conf)
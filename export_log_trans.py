@@ -4,75 +4,83 @@
 @Time    : 2021/3/15 11:00 上午
 @Author  : zhangguanghui
 """
-import os
+import time
 import logging
-from util import Web3, TOPIC_TRANSFER, get_logs, word_to_address, to_normalized_address, export_data, \
-    wait_until_reach, get_path
+from util import LogFetcher, export_data, wait_until_reach, get_path
+from scheduler import iter_ranges, run
+from manifest import Manifest
+from metrics import metrics, configure as configure_metrics
+from schemas import set_encoding
+from columnar import logs_to_table, transfers_to_table, is_transfer
+from logindex import write_index, remove_index
+from events import register_events, event_tables, decode_events
 
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(filename)s[line:%(lineno)d] - %(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
-
-def log_to_dict(log):
-    return {
-        'log_index': log.get('logIndex'),
-        'transaction_hash': log.get('transactionHash').hex(),
-        'transaction_index': log.get('transactionIndex'),
-        'block_hash': log.get('blockHash').hex(),
-        'block_number': log.get('blockNumber'),
-        'address': to_normalized_address(log.get('address')),
-        'data': log.get('data'),
-        'topics': ','.join([i.hex() for i in log.get('topics')])
-    }
-
-
-def transfer_to_dict(transfer):
-    return {
-        'token_address': to_normalized_address(transfer.get('address')),
-        'from_address': word_to_address(transfer.get('topics')[1].hex()) if len(transfer.get('topics')) > 1 else None,
-        'to_address': word_to_address(transfer.get('topics')[2].hex()) if len(transfer.get('topics')) > 2 else None,
-        'value': int(transfer.get('data'), 16) if transfer.get('data') != '0x' else 0,
-        'transaction_hash': transfer.get('transactionHash').hex(),
-        'log_index': transfer.get('logIndex'),
-        'block_number': transfer.get('blockNumber'),
-    }
+TABLES = ['logs', 'token_transfers']
 
 
 def export(web3, config: dict):
-    start, end = config['start'], config['end']
     continue_ = config['continue']
     output, fmt, compression, batch = config['output'], config['format'], config['compression'], config['batch']
+    chunk_size = config['chunk_size']
+    partition_size = config['partition_size']
+    # 获取日志的初始窗口大小，之后根据节点的响应自动调整
+    log_fetcher = LogFetcher(web3, max(batch // 100, 10), config['log_max_window'], config['log_target'],
+                             config['logs_topics'], config['logs_addresses'])
+    manifest = Manifest(output)
+    configure_metrics(config)
+    set_encoding(config['encoding'])
+    register_events(config['events'], config['decode_events'])
+    # logs 和 token_transfers 之外还输出需要解码的事件表
+    tables = TABLES + event_tables()
+
+    for start_block, end_block in iter_ranges(config):
+        path_logs = get_path(output, 'logs', start_block, end_block, fmt, partition_size)
+        path_transfers = get_path(output, 'token_transfers', start_block, end_block, fmt, partition_size)
+        path_events = {table: get_path(output, table, start_block, end_block, fmt, partition_size)
+                       for table in event_tables()}
+
+        # 如果设置 continue_=True，且所有文件都处理过了，则不重复处理
+        if continue_ and manifest.is_done(tables, start_block, end_block):
+            logger.info(f'区块 {start_block}~{end_block} 已处理，跳过')
+            continue
 
-    for start_block in range(start, end, batch):
-        end_block = start_block + batch - 1
-        path_logs = get_path(output, 'logs', start_block, end_block, fmt)
-        path_transfers = get_path(output, 'token_transfers', start_block, end_block, fmt)
+        # 默认不做性能分析，只有配置的第 profile_batch 个区间才分析
+        with metrics.profile(start_block, end_block):
+            # 等待到达最新区块高度
+            wait_until_reach(web3, start_block, batch, config['confirmations'])
+            started, rows = time.time(), {}
 
-        # 等待到达最新区块高度
-        wait_until_reach(web3, start_block, batch)
+            # 获取 logs 和 token_transfers
+            with metrics.timer('fetch'):
+                logs = log_fetcher.get_logs(start_block, end_block)
+            with metrics.timer('transform'):
+                transfers = [i for i in logs if is_transfer(i)]
+                table_logs, table_transfers = logs_to_table(logs), transfers_to_table(transfers)
+                table_events = decode_events(logs)
 
-        # 如果设置 continue_=True，且两个文件都处理过了，则不重复处理
-        if continue_ and os.path.exists(path_logs) and os.path.exists(path_transfers):
-            logger.info(f'区块 {start_block}~{end_block} 已处理，跳过')
-            continue
+            # 保存 logs 及其 (address, topic0) 索引
+            remove_index(path_logs)
+            rows['logs'] = export_data('logs', table_logs, path_logs, fmt, compression, chunk_size)
+            write_index(path_logs, table_logs)
 
-        # 获取 logs 和 token_transfers
-        batch_size = max(batch // 100, 10)  # 获取日志的批大小
-        logs = sum([get_logs(web3, i, i + batch_size - 1) for i in range(start_block, end_block + 1, batch_size)], [])
-        transfers = [i for i in logs if i.topics and i.topics[0].hex().startswith(TOPIC_TRANSFER)]
+            # 保存 token_transfers
+            rows['token_transfers'] = export_data('token_transfers', table_transfers, path_transfers, fmt, compression,
+                                                  chunk_size)
 
-        # 保存 logs
-        data_logs = [log_to_dict(i) for i in logs]
-        export_data('logs', data_logs, path_logs, fmt, compression)
+            # 保存解码后的事件
+            for table, path in path_events.items():
+                rows[table] = export_data(table, table_events[table], path, fmt, compression, chunk_size)
 
-        # 保存 token_transfers
-        data_transfers = [transfer_to_dict(i) for i in transfers]
-        export_data('token_transfers', data_transfers, path_transfers, fmt, compression)
+            # 所有文件都写完后再登记到清单中
+            manifest.add(tables, start_block, end_block, rows, time.time() - started)
+            metrics.flush(start_block, end_block)
 
 
 if __name__ == '__main__':
     from check_config import conf
 
-    w3 = Web3(conf['ipc'])
-    export(w3, conf)
+    run(export, conf)
@@ -5,14 +5,24 @@
 @Author  : zhangguanghui
 """
 import os
+import time
 import logging
-from util import Web3, get_function_sig_hashes, is_erc20_contract, is_erc721_contract, to_normalized_address, \
-    export_data, get_receipt, wait_until_reach, get_path
+from eth_utils import keccak
+from cache import KVCache
+from standards import classify, register_standards
+from util import get_function_sig_hashes, to_normalized_address, export_data, get_receipts, wait_until_reach, \
+    get_path, get_blocks
+from scheduler import iter_ranges, run
+from manifest import Manifest
+from metrics import metrics, configure as configure_metrics
+from schemas import set_encoding
 
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(filename)s[line:%(lineno)d] - %(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
+TABLES = ['receipts', 'contracts']
+
 
 def receipt_to_dict(receipt):
     return {
@@ -28,54 +38,86 @@ def receipt_to_dict(receipt):
     }
 
 
-def contract_to_dict(web3, contract_addr, block_number):
+def get_bytecode_cache(config: dict):
+    # bytecode 分析结果的持久化缓存，以 bytecode 的 keccak 哈希为 key
+    return KVCache(os.path.join(config['cache'], 'bytecodes.sqlite'), 'bytecodes', config['cache_lru_size'])
+
+
+def analyze_bytecode(bytecode, cache=None):
+    # 相同的 bytecode（如工厂合约、代理合约的克隆）只反汇编一次
+    # 缓存中只保存函数选择器，标准识别只是一次集合求交，每次重新计算，以便配置中新增的标准对旧缓存也生效
+    key = keccak(hexstr=bytecode).hex() if cache is not None else None
+    analysis = cache.get(key) if cache is not None else None
+    if analysis is None:
+        analysis = {'function_sighashes': get_function_sig_hashes(bytecode)}
+        if cache is not None:
+            cache.set(key, analysis)
+    return {
+        'function_sighashes': analysis['function_sighashes'],
+        **{f'is_{name}': value for name, value in classify(analysis['function_sighashes']).items()},
+    }
+
+
+def contract_to_dict(web3, contract_addr, block_number, cache=None):
+    # 除了 is_erc20、is_erc721，每个已知标准（包括配置中新增的）都会输出一列 is_<标准名>
     bytecode = web3.eth.get_code(contract_addr).hex()
-    function_sig_hashes = get_function_sig_hashes(bytecode)
+    analysis = analyze_bytecode(bytecode, cache)
     return {
         'address': to_normalized_address(contract_addr),
         'bytecode': bytecode,
-        'function_sighashes': ','.join(function_sig_hashes),
-        'is_erc20': is_erc20_contract(function_sig_hashes),
-        'is_erc721': is_erc721_contract(function_sig_hashes),
+        'function_sighashes': ','.join(analysis['function_sighashes']),
+        **{k: v for k, v in analysis.items() if k.startswith('is_')},
         'block_number': block_number
     }
 
 
 def export(web3, config: dict):
-    start, end = config['start'], config['end']
     continue_ = config['continue']
     output, fmt, compression, batch = config['output'], config['format'], config['compression'], config['batch']
-
-    for start_block in range(start, end, batch):
-        end_block = start_block + batch - 1
-        path_receipts = get_path(output, 'receipts', start_block, end_block, fmt)
-        path_contracts = get_path(output, 'contracts', start_block, end_block, fmt)
-
-        # 等待到达最新区块高度
-        wait_until_reach(web3, start_block, batch)
+    rpc_batch, receipt_workers, chunk_size = config['rpc_batch'], config['receipt_workers'], config['chunk_size']
+    partition_size = config['partition_size']
+    cache = get_bytecode_cache(config)
+    register_standards(config['standards'])
+    manifest = Manifest(output)
+    configure_metrics(config)
+    set_encoding(config['encoding'])
+
+    for start_block, end_block in iter_ranges(config):
+        path_receipts = get_path(output, 'receipts', start_block, end_block, fmt, partition_size)
+        path_contracts = get_path(output, 'contracts', start_block, end_block, fmt, partition_size)
 
         # 如果设置 continue_=True，且两个文件都处理过了，则不重复处理
-        if continue_ and os.path.exists(path_receipts) and os.path.exists(path_contracts):
+        if continue_ and manifest.is_done(TABLES, start_block, end_block):
             logger.info(f'区块 {start_block}~{end_block} 已处理，跳过')
             continue
 
-        # 获取 transactions ID 和 receipts
-        blocks = [web3.eth.get_block(i) for i in range(start_block, end_block + 1)]
-        transaction_hashes = sum([[i.hex() for i in i.transactions] for i in blocks], [])
-        receipts = [get_receipt(web3, i) for i in transaction_hashes]
+        # 默认不做性能分析，只有配置的第 profile_batch 个区间才分析
+        with metrics.profile(start_block, end_block):
+            # 等待到达最新区块高度
+            wait_until_reach(web3, start_block, batch, config['confirmations'])
+            started, rows = time.time(), {}
+
+            # 获取 transactions ID 和 receipts
+            with metrics.timer('fetch'):
+                blocks = get_blocks(web3, start_block, end_block, full_transactions=False, batch_size=rpc_batch)
+                transaction_hashes = [j.hex() for i in blocks for j in i.transactions]
+                receipts = get_receipts(web3, transaction_hashes, batch_size=rpc_batch, workers=receipt_workers)
+
+            # 保存 receipts
+            data_receipts = (receipt_to_dict(i) for i in receipts)
+            rows['receipts'] = export_data('receipts', data_receipts, path_receipts, fmt, compression, chunk_size)
 
-        # 保存 receipts
-        data_receipts = [receipt_to_dict(i) for i in receipts]
-        export_data('receipts', data_receipts, path_receipts, fmt, compression)
+            # 保存 contracts
+            data_contracts = (contract_to_dict(web3, i.contractAddress, i.blockNumber, cache)
+                              for i in receipts if i.get('contractAddress'))
+            rows['contracts'] = export_data('contracts', data_contracts, path_contracts, fmt, compression, chunk_size)
 
-        # 保存 contracts
-        data_contracts = [contract_to_dict(web3, i.contractAddress, i.blockNumber)
-                          for i in receipts if i.get('contractAddress')]
-        export_data('contracts', data_contracts, path_contracts, fmt, compression)
+            # 所有文件都写完后再登记到清单中
+            manifest.add(TABLES, start_block, end_block, rows, time.time() - started)
+            metrics.flush(start_block, end_block)
 
 
 if __name__ == '__main__':
     from check_config import conf
 
-    w3 = Web3(conf['ipc'])
-    export(w3, conf)
+    run(export, conf)
@@ -5,57 +5,113 @@
 @Author  : zhangguanghui
 """
 import os
+import time
 import logging
-from util import Web3, get_first_result, ERC20_ABI, TOPIC_TRANSFER, get_logs, to_normalized_address, export_data, \
-    wait_until_reach, get_path
+from util import LogFetcher, to_normalized_address, export_data, wait_until_reach, get_path, \
+    call_contract_functions
+from scheduler import iter_ranges, run
+from manifest import Manifest
+from metrics import metrics, configure as configure_metrics
+from schemas import set_encoding
+from columnar import is_transfer
+from cache import KVCache
 
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(filename)s[line:%(lineno)d] - %(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
+TABLES = ['tokens']
 
-def token_to_dict(web3, token_addr, block_number=None):
-    contract = web3.eth.contract(token_addr, abi=ERC20_ABI)
-    return {
-        'address': to_normalized_address(token_addr),
-        'symbol': get_first_result(contract.functions.symbol(), contract.functions.SYMBOL()),
-        'name': get_first_result(contract.functions.name(), contract.functions.NAME()),
-        'decimals': get_first_result(contract.functions.decimals(), contract.functions.DECIMALS()),
-        'total_supply': str(get_first_result(contract.functions.totalSupply())),
-        'block_number': block_number
-    }
+
+# token 元数据的字段 -> 候选的 (函数签名, 返回类型)，前一个函数没有结果时才调用下一个
+TOKEN_FUNCTIONS = {
+    'symbol': [('symbol()', 'string'), ('SYMBOL()', 'string')],
+    'name': [('name()', 'string'), ('NAME()', 'string')],
+    'decimals': [('decimals()', 'uint8'), ('DECIMALS()', 'uint8')],
+    'total_supply': [('totalSupply()', 'uint256')],
+}
+
+
+def get_token_cache(config: dict):
+    # token 元数据的持久化缓存，以小写的 token 地址为 key
+    return KVCache(os.path.join(config['cache'], 'tokens.sqlite'), 'tokens', config['cache_lru_size'])
+
+
+def get_tokens_metadata(web3, token_addrs, batch_size=100):
+    # 批量获取多个 token 的元数据：
+    # 第一轮在 batch 中调用所有 token 的首选函数，之后每一轮只为没有结果的字段调用备选函数（如 SYMBOL()）
+    metadata = {addr: {field: None for field in TOKEN_FUNCTIONS} for addr in token_addrs}
+    pending = [(addr, field) for addr in token_addrs for field in TOKEN_FUNCTIONS]
+    candidate = 0
+    while pending:
+        calls = [(addr, *TOKEN_FUNCTIONS[field][candidate]) for addr, field in pending]
+        results = call_contract_functions(web3, calls, batch_size)
+        for (addr, field), result in zip(pending, results):
+            metadata[addr][field] = result
+        candidate += 1
+        pending = [(addr, field) for (addr, field), result in zip(pending, results)
+                   if result is None and candidate < len(TOKEN_FUNCTIONS[field])]
+    for value in metadata.values():
+        # 只把 totalSupply() 返回的整数转换为十进制字符串，没有结果时保持为 None
+        if isinstance(value['total_supply'], int):
+            value['total_supply'] = str(value['total_supply'])
+    return metadata
+
+
+def tokens_to_dicts(web3, token_addrs, block_number=None, cache=None, batch_size=100):
+    # 只有缓存中没有的 token 才会请求节点，调用 revert 的字段为空，节点的临时错误会重试，不会写入缓存
+    addresses = [to_normalized_address(i) for i in token_addrs]
+    cached = {i: cache.get(i) for i in addresses} if cache is not None else {}
+    missing = [i for i in addresses if cached.get(i) is None]
+    fetched = get_tokens_metadata(web3, missing, batch_size)
+    if cache is not None and fetched:
+        cache.set_many(fetched)
+    return [{'address': i, **(cached.get(i) or fetched[i]), 'block_number': block_number} for i in addresses]
 
 
 def export(web3, config: dict):
-    start, end = config['start'], config['end']
     continue_ = config['continue']
     output, fmt, compression, batch = config['output'], config['format'], config['compression'], config['batch']
+    rpc_batch, chunk_size = config['rpc_batch'], config['chunk_size']
+    partition_size = config['partition_size']
+    # 获取日志的初始窗口大小，之后根据节点的响应自动调整
+    log_fetcher = LogFetcher(web3, max(batch // 100, 10), config['log_max_window'], config['log_target'],
+                             config['token_topics'], config['token_addresses'])
+    cache = get_token_cache(config)
+    manifest = Manifest(output)
+    configure_metrics(config)
+    set_encoding(config['encoding'])
 
-    for start_block in range(start, end, batch):
-        end_block = start_block + batch - 1
-        path_tokens = get_path(output, 'tokens', start_block, end_block, fmt)
-
-        # 等待到达最新区块高度
-        wait_until_reach(web3, start_block, batch)
+    for start_block, end_block in iter_ranges(config):
+        path_tokens = get_path(output, 'tokens', start_block, end_block, fmt, partition_size)
 
         # 如果设置 continue_=True，且文件都处理过了，则不重复处理
-        if continue_ and os.path.exists(path_tokens):
+        if continue_ and manifest.is_done(TABLES, start_block, end_block):
             logger.info(f'区块 {start_block}~{end_block} 已处理，跳过')
             continue
 
-        # 获取 token_transfers 和 token 地址
-        batch_size = max(batch // 100, 10)  # 获取日志的批大小
-        logs = sum([get_logs(web3, i, i + batch_size - 1) for i in range(start_block, end_block + 1, batch_size)], [])
-        transfers = [i for i in logs if i.topics and i.topics[0].hex().startswith(TOPIC_TRANSFER)]
-        token_addrs = set([i.address for i in transfers])
+        # 默认不做性能分析，只有配置的第 profile_batch 个区间才分析
+        with metrics.profile(start_block, end_block):
+            # 等待到达最新区块高度
+            wait_until_reach(web3, start_block, batch, config['confirmations'])
+            started, rows = time.time(), {}
+
+            # 获取 token_transfers 和 token 地址，再获取 token 的元数据
+            with metrics.timer('fetch'):
+                logs = log_fetcher.get_logs(start_block, end_block)
+                transfers = [i for i in logs if is_transfer(i)]
+                token_addrs = set([i.address for i in transfers])
+                data_tokens = tokens_to_dicts(web3, token_addrs, block_number=None, cache=cache, batch_size=rpc_batch)
+
+            # 保存 tokens
+            rows['tokens'] = export_data('tokens', data_tokens, path_tokens, fmt, compression, chunk_size)
 
-        # 保存 tokens
-        data_tokens = [token_to_dict(web3, token_addr, block_number=None) for token_addr in token_addrs]
-        export_data('tokens', data_tokens, path_tokens, fmt, compression)
+            # 所有文件都写完后再登记到清单中
+            manifest.add(TABLES, start_block, end_block, rows, time.time() - started)
+            metrics.flush(start_block, end_block)
 
 
 if __name__ == '__main__':
     from check_config import conf
 
-    w3 = Web3(conf['ipc'])
-    export(w3, conf)
+    run(export, conf)
@@ -0,0 +1,105 @@
+# -*- coding: UTF-8 -*-
+"""
+监听最新区块高度：优先通过 IPC 订阅 newHeads，节点出块后立即得到通知
+没有 IPC 路径或订阅失败（如节点不支持）时退回到轮询 eth_blockNumber，轮询间隔在 poll_min 和 poll_max 之间自适应
+"""
+import json
+import time
+import socket
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class HeadWatcher:
+    def __init__(self, block_number, ipc=None, poll_min=1, poll_max=15, timeout=60):
+        # block_number 为查询最新区块高度的函数
+        self.block_number = block_number
+        self.ipc = ipc
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        self.timeout = timeout
+        self.head = -1
+        self._sock = None
+        self._buffer = ''
+        # 订阅失败后不再尝试，直接轮询
+        self._subscribe = ipc is not None
+
+    @staticmethod
+    def _read_message(sock, buffer):
+        # 从 socket 中读取一个完整的 JSON 对象，返回 (对象, 剩余的数据)
+        decoder = json.JSONDecoder()
+        while True:
+            buffer = buffer.lstrip()
+            if buffer:
+                try:
+                    message, index = decoder.raw_decode(buffer)
+                    return message, buffer[index:]
+                except ValueError:
+                    pass
+            chunk = sock.recv(65536)
+            if not chunk:
+                raise ConnectionError('IPC 连接已断开')
+            buffer += chunk.decode('utf-8')
+
+    def _close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            self._buffer = ''
+
+    def _open_subscription(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(self.ipc)
+            sock.sendall(json.dumps({'jsonrpc': '2.0', 'method': 'eth_subscribe', 'params': ['newHeads'],
+                                     'id': 1}).encode('utf-8'))
+            message, self._buffer = self._read_message(sock, '')
+            if 'error' in message:
+                raise ValueError(message['error'])
+        except Exception:
+            sock.close()
+            raise
+        self._sock = sock
+        logger.info('已订阅 newHeads')
+
+    def latest(self):
+        # 查询一次最新区块高度
+        self.head = max(self.head, self.block_number())
+        return self.head
+
+    def wait_for(self, number):
+        # 阻塞直到最新区块高度 >= number，返回最新区块高度
+        if self.head >= number or self.latest() >= number:
+            return self.head
+        logger.info(f'等待区块 {number}，当前最新区块 {self.head}')
+        interval = self.poll_min
+        while self.head < number:
+            if self._subscribe and self._sock is None:
+                try:
+                    self._open_subscription()
+                except Exception as err:
+                    self._subscribe = False
+                    logger.warning(f'订阅 newHeads 失败，改为轮询：{err}')
+                else:
+                    # 订阅之前可能已经出块
+                    self.latest()
+                    continue
+            if self._sock is not None:
+                try:
+                    message, self._buffer = self._read_message(self._sock, self._buffer)
+                except Exception as err:
+                    # 超时内没有新区块或连接断开：重新订阅，并查询一次避免漏掉区块
+                    logger.info(f'newHeads 订阅中断，重新订阅：{err!r}')
+                    self._close()
+                    continue
+                head = message.get('params', {}).get('result', {}).get('number')
+                if head is not None:
+                    self.head = max(self.head, int(head, 16))
+                continue
+            time.sleep(interval)
+            previous = self.head
+            # 有新区块时缩短轮询间隔，否则逐渐延长
+            interval = self.poll_min if self.latest() > previous else min(interval * 2, self.poll_max)
+        return self.head
@@ -19,16 +19,7 @@ CREATE EXTERNAL TABLE IF NOT EXISTS blocks (
     transaction_count BIGINT
 )
 PARTITIONED BY (start_block BIGINT)
-ROW FORMAT SERDE 'org.apache.hadoop.hive.serde2.lazy.LazySimpleSerDe'
-WITH SERDEPROPERTIES (
-    'serialization.format' = ',',
-    'field.delim' = ',',
-    'escape.delim' = '\\'
-)
-STORED AS TEXTFILE
-LOCATION 's3://<your_bucket>/ethereumetl/export/blocks'
-TBLPROPERTIES (
-  'skip.header.line.count' = '1'
-);
+STORED AS PARQUET
+LOCATION 's3://<your_bucket>/ethereumetl/export/blocks';
 
 MSCK REPAIR TABLE blocks;
\ No newline at end of file
@@ -3,19 +3,13 @@ CREATE EXTERNAL TABLE IF NOT EXISTS contracts (
     bytecode STRING,
     function_sighashes STRING,
     is_erc20 BOOLEAN,
-    is_erc721 BOOLEAN
+    is_erc721 BOOLEAN,
+    is_erc1155 BOOLEAN,
+    is_erc777 BOOLEAN,
+    block_number BIGINT
 )
 PARTITIONED BY (start_block BIGINT)
-ROW FORMAT SERDE 'org.apache.hadoop.hive.serde2.lazy.LazySimpleSerDe'
-WITH SERDEPROPERTIES (
-    'serialization.format' = ',',
-    'field.delim' = ',',
-    'escape.delim' = '\\'
-)
-STORED AS TEXTFILE
-LOCATION 's3://<your_bucket>/ethereumetl/export/contracts'
-TBLPROPERTIES (
-  'skip.header.line.count' = '1'
-);
+STORED AS PARQUET
+LOCATION 's3://<your_bucket>/ethereumetl/export/contracts';
 
-MSCK REPAIR TABLE contracts;
+MSCK REPAIR TABLE contracts;
\ No newline at end of file
@@ -6,19 +6,13 @@ CREATE EXTERNAL TABLE IF NOT EXISTS logs (
     block_number BIGINT,
     address STRING,
     data STRING,
-    topics STRING
+    topic0 STRING,
+    topic1 STRING,
+    topic2 STRING,
+    topic3 STRING
 )
 PARTITIONED BY (start_block BIGINT)
-ROW FORMAT SERDE 'org.apache.hadoop.hive.serde2.lazy.LazySimpleSerDe'
-WITH SERDEPROPERTIES (
-    'serialization.format' = ',',
-    'field.delim' = ',',
-    'escape.delim' = '\\'
-)
-STORED AS TEXTFILE
-LOCATION 's3://<your_bucket>/ethereumetl/export/logs'
-TBLPROPERTIES (
-  'skip.header.line.count' = '1'
-);
+STORED AS PARQUET
+LOCATION 's3://<your_bucket>/ethereumetl/export/logs';
 
-MSCK REPAIR TABLE logs;
+MSCK REPAIR TABLE logs;
\ No newline at end of file
@@ -10,16 +10,7 @@ CREATE EXTERNAL TABLE IF NOT EXISTS receipts (
     status BIGINT
 )
 PARTITIONED BY (start_block BIGINT)
-ROW FORMAT SERDE 'org.apache.hadoop.hive.serde2.lazy.LazySimpleSerDe'
-WITH SERDEPROPERTIES (
-    'serialization.format' = ',',
-    'field.delim' = ',',
-    'escape.delim' = '\\'
-)
-STORED AS TEXTFILE
-LOCATION 's3://<your_bucket>/ethereumetl/export/receipts'
-TBLPROPERTIES (
-  'skip.header.line.count' = '1'
-);
+STORED AS PARQUET
+LOCATION 's3://<your_bucket>/ethereumetl/export/receipts';
 
-MSCK REPAIR TABLE receipts;
+MSCK REPAIR TABLE receipts;
\ No newline at end of file
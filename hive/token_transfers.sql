@@ -2,22 +2,13 @@ CREATE EXTERNAL TABLE IF NOT EXISTS token_transfers (
     token_address STRING,
     from_address STRING,
     to_address STRING,
-    value DECIMAL(38,0),
+    value BINARY,
     transaction_hash STRING,
     log_index BIGINT,
     block_number BIGINT
 )
 PARTITIONED BY (start_block BIGINT)
-ROW FORMAT SERDE 'org.apache.hadoop.hive.serde2.lazy.LazySimpleSerDe'
-WITH SERDEPROPERTIES (
-    'serialization.format' = ',',
-    'field.delim' = ',',
-    'escape.delim' = '\\'
-)
-STORED AS TEXTFILE
-LOCATION 's3://<your_bucket>/ethereumetl/export/token_transfers'
-TBLPROPERTIES (
-  'skip.header.line.count' = '1'
-);
+STORED AS PARQUET
+LOCATION 's3://<your_bucket>/ethereumetl/export/token_transfers';
 
 MSCK REPAIR TABLE token_transfers;
\ No newline at end of file
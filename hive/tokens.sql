@@ -3,19 +3,11 @@ CREATE EXTERNAL TABLE IF NOT EXISTS tokens (
     symbol STRING,
     name STRING,
     decimals BIGINT,
-    total_supply DECIMAL(38,0)
+    total_supply BINARY,
+    block_number BIGINT
 )
 PARTITIONED BY (start_block BIGINT)
-ROW FORMAT SERDE 'org.apache.hadoop.hive.serde2.lazy.LazySimpleSerDe'
-WITH SERDEPROPERTIES (
-    'serialization.format' = ',',
-    'field.delim' = ',',
-    'escape.delim' = '\\'
-)
-STORED AS TEXTFILE
-LOCATION 's3://<your_bucket>/ethereumetl/export/tokens'
-TBLPROPERTIES (
-  'skip.header.line.count' = '1'
-);
+STORED AS PARQUET
+LOCATION 's3://<your_bucket>/ethereumetl/export/tokens';
 
-MSCK REPAIR TABLE tokens;
+MSCK REPAIR TABLE tokens;
\ No newline at end of file
@@ -9,19 +9,11 @@ CREATE EXTERNAL TABLE IF NOT EXISTS transactions (
     value DECIMAL(38,0),
     gas BIGINT,
     gas_price BIGINT,
-    input STRING
+    input STRING,
+    block_timestamp BIGINT
 )
 PARTITIONED BY (start_block BIGINT)
-ROW FORMAT SERDE 'org.apache.hadoop.hive.serde2.lazy.LazySimpleSerDe'
-WITH SERDEPROPERTIES (
-    'serialization.format' = ',',
-    'field.delim' = ',',
-    'escape.delim' = '\\'
-)
-STORED AS TEXTFILE
-LOCATION 's3://<your_bucket>/ethereumetl/export/transactions'
-TBLPROPERTIES (
-  'skip.header.line.count' = '1'
-);
+STORED AS PARQUET
+LOCATION 's3://<your_bucket>/ethereumetl/export/transactions';
 
 MSCK REPAIR TABLE transactions;
\ No newline at end of file
@@ -0,0 +1,110 @@
+# -*- coding: UTF-8 -*-
+"""
+logs 文件的旁路索引：每个 logs 文件旁边保存一个 _<文件名>.index.json，内容为该文件中不重复的 (address, topic0)
+按事件查询时先读取索引，跳过不可能包含该事件的文件；索引的文件名以 _ 开头，Hive、Spark 等读取目录时会忽略
+没有索引的文件（如旧版本输出的文件）视为可能包含，可以运行 python logindex.py --build 补建索引
+"""
+import os
+import re
+import json
+import argparse
+import configparser
+import pyarrow as pa
+import pyarrow.csv as pcsv
+import pyarrow.parquet as pq
+from pathlib import Path
+from schemas import to_hex
+
+INDEX_SUFFIX = '.index.json'
+PATTERN = re.compile(r'^logs_(\d+)_(\d+)\.(csv|parquet)$')
+
+
+def to_lower(value):
+    return value.lower() if isinstance(value, str) else value
+
+
+def index_path(path):
+    dir_name, name = os.path.split(path)
+    return os.path.join(dir_name, '_' + name + INDEX_SUFFIX)
+
+
+def split_topics(table: pa.Table):
+    # 旧版本输出的 logs 中所有 topic 以逗号连接保存在 topics 一列中，拆分为 topic0~topic3
+    if 'topics' not in table.column_names:
+        return table
+    topics = [i.split(',') if i else [] for i in table.column('topics').to_pylist()]
+    table = table.remove_column(table.column_names.index('topics'))
+    for k in range(4):
+        table = table.append_column(f'topic{k}', pa.array([i[k] if len(i) > k else None for i in topics], pa.string()))
+    return table
+
+
+def build_index(table: pa.Table):
+    # 返回 table 中不重复的 [address, topic0]，hex 字符串，按 address、topic0 排序
+    pairs = split_topics(table).select(['address', 'topic0']).group_by(['address', 'topic0']).aggregate([])
+    pairs = {(to_lower(to_hex(a)), to_lower(to_hex(t))) for a, t in zip(pairs.column('address').to_pylist(),
+                                                                        pairs.column('topic0').to_pylist())}
+    # 没有 topic 的 log（LOG0）的 topic0 为空
+    return sorted([list(i) for i in pairs], key=lambda i: (i[0] or '', i[1] or ''))
+
+
+def write_index(path, table: pa.Table):
+    # 在数据文件写完之后调用，先写入临时文件再重命名
+    path_index = index_path(path)
+    with open(path_index + '.tmp', 'w') as f:
+        json.dump({'pairs': build_index(table)}, f)
+    os.replace(path_index + '.tmp', path_index)
+
+
+def remove_index(path):
+    # 重写数据文件之前先删除旧的索引，中途中断时没有索引的文件视为可能包含，不会漏掉数据
+    if os.path.exists(index_path(path)):
+        os.remove(index_path(path))
+
+
+def might_contain(path, address=None, topic0=None):
+    # 文件中可能包含 address 合约的 topic0 事件时返回 True，address 或 topic0 为空表示不限
+    if not os.path.exists(index_path(path)):
+        return True
+    with open(index_path(path)) as f:
+        pairs = json.load(f)['pairs']
+    address, topic0 = to_lower(address), to_lower(topic0)
+    return any((address is None or a == address) and (topic0 is None or t == topic0) for a, t in pairs)
+
+
+def iter_files(dir_logs, address=None, topic0=None):
+    # 遍历 logs 目录（包括 layout = hive 时的分区目录），返回可能包含该事件的数据文件
+    for dir_name, _, names in sorted(os.walk(dir_logs)):
+        for name in sorted(names):
+            path = os.path.join(dir_name, name)
+            if PATTERN.match(name) and might_contain(path, address, topic0):
+                yield path
+
+
+def read_logs(path):
+    if path.endswith('.csv'):
+        return pcsv.read_csv(path, convert_options=pcsv.ConvertOptions(strings_can_be_null=True))
+    return pq.read_table(path)
+
+
+if __name__ == '__main__':
+    path_config = Path(__file__).parent / 'config.ini'
+    assert path_config.exists(), '配置文件 config.ini 不存在'
+    config = configparser.ConfigParser()
+    config.read(path_config)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--address', '-a', help='合约地址')
+    parser.add_argument('--topic0', '-t', help='事件签名的哈希')
+    parser.add_argument('--build', action='store_true', help='为没有索引的 logs 文件补建索引')
+    args = parser.parse_args()
+
+    dir_output = os.path.join(config['output']['path'], 'logs')
+    if args.build:
+        for path_logs in iter_files(dir_output):
+            if not os.path.exists(index_path(path_logs)):
+                write_index(path_logs, read_logs(path_logs))
+                print(f'{path_logs} -> {index_path(path_logs)}')
+    else:
+        for path_logs in iter_files(dir_output, args.address, args.topic0):
+            print(path_logs)
@@ -0,0 +1,125 @@
+# -*- coding: UTF-8 -*-
+"""
+已完成区间的清单：每张表的每个区间写完（文件已原子地重命名到位）后记录一行，continue 时据此跳过
+清单保存在输出目录下的 manifest.sqlite 中，(表名, 开始区块) 为主键，查询一个区间是否完成只需一次索引查找
+每行同时记录行数、耗时和完成时间，summary.py 直接从清单中统计进度，不需要遍历输出目录
+对于没有清单的旧输出目录，可以运行 python manifest.py 把已有的数据文件登记为已完成
+"""
+import os
+import re
+import sqlite3
+import time
+import threading
+
+MANIFEST_NAME = 'manifest.sqlite'
+
+
+class Manifest:
+    # 多个工作进程可以共用同一个清单文件
+    def __init__(self, output):
+        os.makedirs(output, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(output, MANIFEST_NAME), timeout=60, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS ranges ('
+                           'table_name TEXT, start_block INTEGER, end_block INTEGER, '
+                           'PRIMARY KEY (table_name, start_block))')
+        # 行数、耗时（秒）和完成时间（unix 时间戳），由 python manifest.py 登记的旧文件中为 NULL
+        columns = [i[1] for i in self._conn.execute('PRAGMA table_info(ranges)')]
+        for column, type_ in [('rows', 'INTEGER'), ('seconds', 'REAL'), ('finished_at', 'REAL')]:
+            if column not in columns:
+                self._conn.execute(f'ALTER TABLE ranges ADD COLUMN {column} {type_}')
+        self._conn.commit()
+
+    def is_done(self, tables, start_block, end_block):
+        # tables 中的每张表都已完成 [start_block, end_block] 时返回 True
+        with self._lock:
+            for table in tables:
+                row = self._conn.execute('SELECT end_block FROM ranges WHERE table_name = ? AND start_block = ?',
+                                         (table, start_block)).fetchone()
+                if row is None or row[0] != end_block:
+                    return False
+            return True
+
+    def add(self, tables, start_block, end_block, rows=None, seconds=None):
+        # 在所有文件写完之后调用，同一事务中登记多张表
+        # rows 为 {表名: 行数}，seconds 为处理该区间的耗时
+        rows = rows or {}
+        finished_at = time.time()
+        self.add_many([(table, start_block, end_block, rows.get(table), seconds, finished_at) for table in tables])
+
+    def add_many(self, ranges, replace=True):
+        # ranges 为 (表名, 开始区块, 结束区块, 行数, 耗时, 完成时间) 的 list，replace=False 时不覆盖已有的记录
+        with self._lock:
+            self._conn.executemany(f'INSERT OR {"REPLACE" if replace else "IGNORE"} INTO ranges '
+                                   '(table_name, start_block, end_block, rows, seconds, finished_at) '
+                                   'VALUES (?, ?, ?, ?, ?, ?)', ranges)
+            self._conn.commit()
+
+    def progress(self):
+        # 每张表的进度：{表名: {files, min_block, max_block, rows, rows_per_second}}
+        # rows_per_second 为有记录的区间的总行数除以从最早开始到最晚完成的时间，多进程时即整体吞吐量
+        with self._lock:
+            result = self._conn.execute('SELECT table_name, COUNT(*), MIN(start_block), MAX(end_block), SUM(rows), '
+                                        'MAX(finished_at) - MIN(finished_at - seconds) '
+                                        'FROM ranges GROUP BY table_name').fetchall()
+        return {table: {'files': files, 'min_block': min_block, 'max_block': max_block, 'rows': rows,
+                        'rows_per_second': rows / elapsed if rows is not None and elapsed else None}
+                for table, files, min_block, max_block, rows, elapsed in result}
+
+    def gaps(self, table):
+        # 返回 [min_block, max_block] 之间没有完成的区块区间 [(开始区块, 结束区块), ...]
+        with self._lock:
+            return self._conn.execute('SELECT prev_end + 1, start_block - 1 FROM ('
+                                      'SELECT start_block, LAG(end_block) OVER (ORDER BY start_block) AS prev_end '
+                                      'FROM ranges WHERE table_name = ?) '
+                                      'WHERE start_block > prev_end + 1', (table,)).fetchall()
+
+    def blocks_done(self, table, start_block, end_block):
+        # 起始高度在 [start_block, end_block] 中的已完成区间共包含多少个区块
+        with self._lock:
+            return self._conn.execute('SELECT COALESCE(SUM(end_block - start_block + 1), 0) FROM ranges '
+                                      'WHERE table_name = ? AND start_block BETWEEN ? AND ?',
+                                      (table, start_block, end_block)).fetchone()[0]
+
+    def ranges(self, table, start_block, end_block):
+        # 与 [start_block, end_block] 有重叠的已完成区间 [(开始区块, 结束区块), ...]，按开始区块排序
+        with self._lock:
+            return self._conn.execute('SELECT start_block, end_block FROM ranges '
+                                      'WHERE table_name = ? AND start_block <= ? AND end_block >= ? '
+                                      'ORDER BY start_block', (table, end_block, start_block)).fetchall()
+
+    def close(self):
+        self._conn.close()
+
+
+def register_existing(output):
+    # 把输出目录中已有的数据文件登记到清单中，返回登记的文件数
+    # 只识别 get_path 生成的文件名，写到一半的 .tmp 文件会被忽略；layout = hive 时文件在 start_block=<分区> 目录中
+    pattern = re.compile(r'^(\w+)_(\d+)_(\d+)\.(csv|parquet)$')
+    ranges = []
+    for table in sorted(os.listdir(output)):
+        dir_table = os.path.join(output, table)
+        if not os.path.isdir(dir_table):
+            continue
+        for _, _, names in os.walk(dir_table):
+            for name in names:
+                m = pattern.match(name)
+                if m and m.group(1) == table:
+                    ranges.append((table, int(m.group(2)), int(m.group(3)), None, None, None))
+    manifest = Manifest(output)
+    manifest.add_many(ranges, replace=False)
+    manifest.close()
+    return len(ranges)
+
+
+if __name__ == '__main__':
+    import configparser
+    from pathlib import Path
+
+    path_config = Path(__file__).parent / 'config.ini'
+    assert path_config.exists(), '配置文件 config.ini 不存在'
+    config = configparser.ConfigParser()
+    config.read(path_config)
+    dir_output = config['output']['path']
+    print(f'{dir_output} 中登记了 {register_existing(dir_output)} 个已有的文件')
@@ -0,0 +1,144 @@
+# -*- coding: UTF-8 -*-
+"""
+运行指标：各阶段（fetch、transform、write）的耗时，RPC 的请求数、batch 数、重试数和错误数，每张表的行数和字节数
+每处理完一个区间输出一次，格式为 Prometheus 文本文件（供 node_exporter 的 textfile collector 读取）或 JSON lines
+还可以对第 profile_batch 个区间做一次 cProfile 或 pyinstrument 分析，结果保存在指标目录中
+"""
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'ethereum_etl_'
+
+
+def format_key(name, labels):
+    # 与 Prometheus 的格式相同，如 rpc_requests_total{method="eth_getLogs"}
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+
+class Metrics:
+    # 进程内的累计值，多个工作进程各自输出到不同的文件
+    def __init__(self):
+        self.values = defaultdict(float)
+        self._flushed = {}
+        self._lock = threading.Lock()
+        self.fmt = None
+        self.path = None
+        self.profiler = None
+        self.profile_batch = 1
+        self.batches = 0
+        self.name = os.path.splitext(os.path.basename(sys.argv[0]))[0] or 'etl'
+
+    def configure(self, fmt=None, path='metrics', profiler=None, profile_batch=1):
+        # fmt 为 prometheus、jsonl 或 None（不输出）；profiler 为 cprofile、pyinstrument 或 None
+        self.fmt = fmt
+        self.path = path
+        self.profiler = profiler
+        self.profile_batch = profile_batch
+        if fmt or profiler:
+            os.makedirs(path, exist_ok=True)
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self.values[(name, tuple(sorted(labels.items())))] += value
+
+    @contextmanager
+    def timer(self, phase, **labels):
+        # 累计一个阶段的耗时和次数
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.inc('phase_seconds_total', time.time() - started, phase=phase, **labels)
+            self.inc('phase_calls_total', phase=phase, **labels)
+
+    def will_profile(self):
+        # 下一次调用 profile 时是否会进行分析
+        return self.profiler is not None and self.batches + 1 == self.profile_batch
+
+    @contextmanager
+    def profile(self, start_block, end_block):
+        # 每处理一个区间调用一次，只分析第 profile_batch 个区间；只能分析调用线程中的代码
+        self.batches += 1
+        if self.profiler is None or self.batches != self.profile_batch:
+            yield
+            return
+        prefix = os.path.join(self.path, f'{self.name}.{os.getpid()}.{start_block}_{end_block}')
+        if self.profiler == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                logger.warning('没有安装 pyinstrument，跳过分析')
+                yield
+                return
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                with open(prefix + '.html', 'w', encoding='utf-8') as f:
+                    f.write(profiler.output_html())
+                logger.info(f'区块 {start_block}~{end_block} 的分析结果 -> {prefix}.html')
+        else:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                profiler.dump_stats(prefix + '.prof')
+                logger.info(f'区块 {start_block}~{end_block} 的分析结果 -> {prefix}.prof，可用 python -m pstats 查看')
+
+    def flush(self, start_block, end_block):
+        # 每处理完一个区间调用一次
+        self.inc('ranges_total')
+        self.inc('blocks_total', end_block - start_block + 1)
+        with self._lock:
+            values = dict(self.values)
+        values[('last_block', ())] = end_block
+        if self.fmt == 'prometheus':
+            self._write_prometheus(values)
+        elif self.fmt == 'jsonl':
+            self._write_jsonl(values, start_block, end_block)
+        self._flushed = values
+
+    def _write_prometheus(self, values):
+        # 累计值，先写入临时文件再重命名，避免被读到写了一半的文件
+        path = os.path.join(self.path, f'{self.name}.{os.getpid()}.prom')
+        lines = []
+        for name in sorted(set(k[0] for k in values)):
+            lines.append(f'# TYPE {PREFIX}{name} {"gauge" if name == "last_block" else "counter"}')
+            for (n, labels), value in sorted(values.items()):
+                if n == name:
+                    lines.append(f'{format_key(PREFIX + n, labels + (("pid", os.getpid()),))} {value:g}')
+        with open(path + '.tmp', 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(path + '.tmp', path)
+
+    def _write_jsonl(self, values, start_block, end_block):
+        # 每个区间一行，记录该区间的增量
+        delta = {format_key(n, labels): round(value - self._flushed.get((n, labels), 0), 6)
+                 for (n, labels), value in values.items() if n != 'last_block'}
+        record = {'time': time.time(), 'script': self.name, 'pid': os.getpid(),
+                  'start_block': start_block, 'end_block': end_block,
+                  'metrics': {k: v for k, v in sorted(delta.items()) if v}}
+        with open(os.path.join(self.path, f'{self.name}.jsonl'), 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+
+metrics = Metrics()
+
+
+def configure(config: dict):
+    metrics.configure(config['metrics_format'], config['metrics_path'], config['profile'], config['profile_batch'])
@@ -0,0 +1,318 @@
+# -*- coding: UTF-8 -*-
+"""
+节点连接池：每个节点（IPC 路径，或 http(s)://、ws(s):// 地址）保持若干个连接，工作线程通过 checkout 独占一个连接
+连接的健康状态由实际请求的成败得到，不再在每次访问前调用 isConnected；
+请求失败的连接在退避（指数增长并加入随机抖动）之后才重新连接
+配置了多个节点时，按各节点的延迟和错误率（指数移动平均）加权随机地分配请求，并定期比较各节点的 blockNumber，
+落后超过 max_lag 个区块的节点暂时不再分配请求
+"""
+import json
+import time
+import random
+import socket
+import asyncio
+import logging
+import threading
+import requests
+import web3
+import concurrent.futures
+from contextlib import contextmanager
+from websockets.exceptions import ConnectionClosed
+from web3._utils.threads import Timeout
+from web3.middleware import geth_poa_middleware
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 传输层的异常：连接断开、超时等（requests 的异常都是 OSError 的子类）；IPC 读取超时抛出 web3 的 Timeout
+TRANSPORT_ERRORS = (OSError, Timeout, asyncio.TimeoutError, concurrent.futures.TimeoutError, ConnectionClosed)
+
+
+def endpoint_kind(uri):
+    if uri.startswith(('http://', 'https://')):
+        return 'http'
+    if uri.startswith(('ws://', 'wss://')):
+        return 'ws'
+    return 'ipc'
+
+
+def make_provider(uri, timeout):
+    kind = endpoint_kind(uri)
+    if kind == 'http':
+        return web3.Web3.HTTPProvider(uri, request_kwargs={'timeout': timeout})
+    if kind == 'ws':
+        return web3.Web3.WebsocketProvider(uri, websocket_timeout=timeout)
+    return web3.Web3.IPCProvider(uri, timeout=timeout)
+
+
+class EndpointStats:
+    # 一个节点的统计信息，由该节点的所有连接共享
+    def __init__(self, uri, alpha=0.2, default_latency=0.1):
+        self.uri = uri
+        self.alpha = alpha
+        self.latency = default_latency
+        self.error_rate = 0.0
+        self.head = None
+        self.lagging = False
+
+    def record(self, seconds, ok):
+        self.error_rate = (1 - self.alpha) * self.error_rate + self.alpha * (0 if ok else 1)
+        if ok:
+            self.latency = (1 - self.alpha) * self.latency + self.alpha * seconds
+
+    @property
+    def weight(self):
+        # 延迟越低、错误率越低，被选中的概率越高
+        return 1 / (max(self.latency, 0.001) * (1 + 10 * self.error_rate))
+
+
+class Connection:
+    # 一个节点连接：web3.Web3 实例用于 eth 接口，batch_request 用于发送原始的 JSON-RPC batch
+    def __init__(self, uri, timeout=600, max_failures=15, stats=None, pool=None):
+        self.uri = uri
+        # 所属的连接池，请求失败时可以改由其他节点处理
+        self.pool = pool
+        self.max_failures = max_failures
+        self.stats = stats or EndpointStats(uri)
+        self.kind = endpoint_kind(uri)
+        self.timeout = timeout
+        self.failures = 0
+        self.retry_at = 0
+        # pick 得到的连接由多个线程共享，failures 和 retry_at 的读改写需要加锁
+        self._lock = threading.Lock()
+        self.w3 = None
+        self._sock = None
+        self._session = None
+        self.connect()
+
+    def connect(self):
+        self.close()
+        self.w3 = web3.Web3(make_provider(self.uri, self.timeout))
+        self.w3.middleware_onion.inject(geth_poa_middleware, layer=0)  # 注入 poa 兼容中间件到最内层
+        # 健康检查在 poa 中间件之内，改由其他节点处理时只需直接调用该节点的 provider，响应仍经过本连接的各个中间件
+        self.w3.middleware_onion.inject(self._health_middleware, 'health', layer=0)
+
+    def _send(self, make_request, method, params):
+        # 发送一个请求并记录节点的健康状态：只有传输层的异常（连接断开、超时等）才算失败，
+        # 节点返回的 error（如 execution reverted）不影响健康状态
+        started = time.time()
+        metrics.inc('rpc_requests_total', method=method)
+        try:
+            response = make_request(method, params)
+        except TRANSPORT_ERRORS:
+            metrics.inc('rpc_errors_total', method=method)
+            self.stats.record(time.time() - started, False)
+            self.mark_failed()
+            raise
+        self.stats.record(time.time() - started, True)
+        self.mark_ok()
+        return response
+
+    def request(self, method, params):
+        # 不经过 web3 的中间件，直接通过 provider 发送一个请求，返回原始的 JSON-RPC 响应；失败时不重试
+        return self._send(self.w3.provider.make_request, method, params)
+
+    def _health_middleware(self, make_request, w3):
+        # 失败后如果有其他正常的节点则改由其他节点处理，否则按退避时间等待再重试，provider 会在下一次请求时重新建立连接
+        def middleware(method, params):
+            while True:
+                try:
+                    return self._send(make_request, method, params)
+                except TRANSPORT_ERRORS as err:
+                    failures = self.failures
+                    if failures > self.max_failures:
+                        raise
+                    alternative = self.pool.alternative(self) if self.pool else None
+                    if alternative is not None:
+                        metrics.inc('rpc_failovers_total', method=method)
+                        logger.warning(f'{method} 请求节点 {self.uri} 失败，改由节点 {alternative.uri} 处理：{err!r}')
+                        try:
+                            return alternative.request(method, params)
+                        except TRANSPORT_ERRORS as alternative_err:
+                            logger.warning(f'{method} 请求节点 {alternative.uri} 也失败了：{alternative_err!r}')
+                    wait = max(self.retry_at - time.time(), 0)
+                    logger.warning(f'{method} 请求节点 {self.uri} 连续失败 {failures} 次，{wait:.1f} 秒后重试：{err!r}')
+                    metrics.inc('rpc_retries_total', method=method)
+                    time.sleep(wait)
+        return middleware
+
+    @property
+    def healthy(self):
+        return self.failures == 0
+
+    def mark_ok(self):
+        with self._lock:
+            self.failures = 0
+
+    def mark_failed(self, base=1, cap=60):
+        # 连续失败 n 次后，等待 min(base * 2^(n-1), cap) 秒（随机抖动 ±50%）再重新连接
+        with self._lock:
+            self.failures += 1
+            delay = min(base * 2 ** (self.failures - 1), cap)
+            self.retry_at = time.time() + delay * random.uniform(0.5, 1.5)
+
+    def batch_request(self, method, params_list):
+        # 在一个 JSON-RPC batch 中发送多个同名请求，按 params_list 的顺序返回各自的响应（含 result 或 error）
+        request = [{'jsonrpc': '2.0', 'method': method, 'params': params, 'id': i}
+                   for i, params in enumerate(params_list)]
+        started = time.time()
+        metrics.inc('rpc_batches_total', method=method)
+        metrics.inc('rpc_requests_total', len(params_list), method=method)
+        try:
+            if self.kind == 'http':
+                responses = self._post(request)
+            elif self.kind == 'ws':
+                responses = self._send_ws(request)
+            else:
+                responses = self._send_ipc(request, method)
+        except Exception:
+            metrics.inc('rpc_errors_total', method=method)
+            self.stats.record(time.time() - started, False)
+            self.close()
+            self.mark_failed()
+            raise
+        self.stats.record(time.time() - started, True)
+        self.mark_ok()
+        if not isinstance(responses, list):
+            raise ValueError(f'{method} batch 请求失败：{responses.get("error")}')
+        return sorted(responses, key=lambda r: r['id'])
+
+    def _send_ipc(self, request, method):
+        # 连接在多次 batch 之间复用，出错时关闭，下次重新建立
+        if self._sock is None:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.settimeout(self.timeout)
+            self._sock.connect(self.uri)
+        self._sock.sendall(json.dumps(request).encode('utf-8'))
+        raw_response = bytearray()
+        while True:
+            chunk = self._sock.recv(1 << 16)
+            if not chunk:
+                raise ConnectionError(f'{method} batch 请求的响应不完整')
+            raw_response += chunk
+            # 响应可能被拆分成多段，只有以 ] 或 } 结尾时才尝试解析
+            if raw_response.rstrip().endswith((b']', b'}')):
+                try:
+                    return json.loads(raw_response)
+                except ValueError:
+                    continue
+
+    def _post(self, request):
+        if self._session is None:
+            self._session = requests.Session()
+        response = self._session.post(self.uri, json=request, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _send_ws(self, request):
+        provider = self.w3.provider
+        future = asyncio.run_coroutine_threadsafe(provider.coro_make_request(json.dumps(request).encode('utf-8')),
+                                                  web3.Web3.WebsocketProvider._loop)
+        return future.result(self.timeout)
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+class Web3Pool:
+    # 每个节点 size 个连接；checkout 独占一个连接，pick 只挑选一个连接而不独占（web3 的 provider 本身是线程安全的）
+    def __init__(self, uris, size=4, timeout=600, max_failures=15, max_lag=5, lag_interval=30):
+        self.max_failures = max_failures
+        self.max_lag = max_lag
+        self.lag_interval = lag_interval
+        self.stats = {uri: EndpointStats(uri) for uri in uris}
+        self.connections = [Connection(uri, timeout, max_failures, self.stats[uri], self)
+                            for uri in uris for _ in range(size)]
+        self._idle = list(self.connections)
+        self._condition = threading.Condition()
+        if len(uris) > 1:
+            # 检查节点落后程度使用单独的连接，超时较短，且不重试
+            self._monitors = {uri: Connection(uri, timeout=10, stats=EndpointStats(uri)) for uri in uris}
+            self.check_lag()
+            threading.Thread(target=self._monitor, daemon=True).start()
+
+    def check_lag(self):
+        # 查询所有节点的 blockNumber，比最高的节点落后超过 max_lag 个区块（或查询失败）的节点不再分配请求
+        for uri, conn in self._monitors.items():
+            try:
+                self.stats[uri].head = int(conn.batch_request('eth_blockNumber', [[]])[0]['result'], 16)
+            except Exception as err:
+                logger.warning(f'查询节点 {uri} 的 blockNumber 失败：{err!r}')
+                self.stats[uri].head = None
+        top = max([i.head for i in self.stats.values() if i.head is not None], default=None)
+        for stats in self.stats.values():
+            lagging = top is not None and (stats.head is None or stats.head < top - self.max_lag)
+            if lagging != stats.lagging:
+                logger.warning(f'节点 {stats.uri} 的区块高度 {stats.head}，最高 {top}，' +
+                               ('暂停分配请求' if lagging else '恢复分配请求'))
+            stats.lagging = lagging
+            if stats.head is not None and not lagging:
+                # 节点已经恢复，之前失败的连接不必再等待退避时间；被其他线程独占的连接在归还之后再由 _choose 重新连接
+                with self._condition:
+                    for conn in self._idle:
+                        if conn.uri == stats.uri and not conn.healthy:
+                            conn.connect()
+                            conn.mark_ok()
+
+    def _monitor(self):
+        while True:
+            time.sleep(self.lag_interval)
+            self.check_lag()
+
+    def alternative(self, conn):
+        # 其他节点中健康且没有落后的连接，没有时返回 None
+        with self._condition:
+            candidates = [i for i in self.connections if i.uri != conn.uri and i.healthy and not i.stats.lagging]
+            return random.choices(candidates, weights=[i.stats.weight for i in candidates])[0] if candidates else None
+
+    def _choose(self, candidates):
+        # 优先从健康且没有落后的节点的连接中，按节点的权重随机选择；其次选择已经到了重连时间的空闲连接；都没有时返回 None
+        # 重新连接会关闭连接上的 socket，被其他线程独占的连接不能重新连接
+        now = time.time()
+        healthy = [i for i in candidates if i.healthy]
+        in_sync = [i for i in healthy if not i.stats.lagging] or healthy
+        if in_sync:
+            return random.choices(in_sync, weights=[i.stats.weight for i in in_sync])[0]
+        due = [i for i in candidates if i.retry_at <= now and i in self._idle]
+        if due:
+            conn = min(due, key=lambda i: i.retry_at)
+            if conn.failures > self.max_failures:
+                raise ValueError(f'节点 {conn.uri} 连续失败次数超过最大重试次数 {self.max_failures}')
+            logger.warning(f'重新连接节点 {conn.uri}（已连续失败 {conn.failures} 次）')
+            conn.connect()
+            return conn
+        return None
+
+    def _wait_time(self, candidates):
+        # 距离空闲连接中最早的重连时间还有多久，没有空闲的候选连接时一直等待其他线程归还
+        candidates = [i for i in candidates if i in self._idle]
+        return max(min(i.retry_at for i in candidates) - time.time(), 0.01) if candidates else None
+
+    def pick(self):
+        with self._condition:
+            while True:
+                conn = self._choose(self.connections)
+                if conn is not None:
+                    return conn
+                self._condition.wait(self._wait_time(self.connections))
+
+    @contextmanager
+    def checkout(self):
+        with self._condition:
+            while True:
+                conn = self._choose(self._idle)
+                if conn is not None:
+                    self._idle.remove(conn)
+                    break
+                self._condition.wait(self._wait_time(self._idle))
+        try:
+            yield conn
+        finally:
+            with self._condition:
+                self._idle.append(conn)
+                self._condition.notify()
@@ -0,0 +1,89 @@
+# -*- coding: UTF-8 -*-
+"""
+分叉（reorg）检测：保存最近 window 个已输出区块的 (number, hash, parent_hash)，新区间的第一个区块的 parent_hash
+与已保存的上一个区块的 hash 不一致时，说明链发生了分叉，再向节点查询找出分叉点，由调用方重新输出受影响的区间
+窗口保存在输出目录的 manifest.sqlite 中，进程重启后仍然有效
+"""
+import os
+import logging
+import sqlite3
+import threading
+from manifest import MANIFEST_NAME
+from util import get_blocks
+
+logger = logging.getLogger(__name__)
+
+
+class ReorgDetector:
+    def __init__(self, output, window=128):
+        self.window = window
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(output, MANIFEST_NAME), timeout=60, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS recent_blocks ('
+                           'number INTEGER PRIMARY KEY, hash TEXT, parent_hash TEXT)')
+        self._conn.commit()
+
+    def _hash(self, number):
+        row = self._conn.execute('SELECT hash FROM recent_blocks WHERE number = ?', (number,)).fetchone()
+        return row[0] if row else None
+
+    def add(self, blocks):
+        # 记录已经输出的区块，只保留最高的 window 个
+        with self._lock:
+            self._conn.executemany('INSERT OR REPLACE INTO recent_blocks (number, hash, parent_hash) VALUES (?, ?, ?)',
+                                   [(i.number, i.hash.hex(), i.parentHash.hex()) for i in blocks])
+            self._conn.execute('DELETE FROM recent_blocks WHERE number <= (SELECT MAX(number) FROM recent_blocks) - ?',
+                               (self.window,))
+            self._conn.commit()
+
+    @staticmethod
+    def check_receipts(blocks, receipts):
+        # receipts 在 blocks 之后另外获取，可能来自其他节点，期间发生分叉时 receipts（及其中的 logs）与 blocks 不在同一条链上
+        # 返回第一个 block_hash 与同一高度的区块不一致的 receipt 的区块高度，都一致时返回 None
+        hashes = {i.number: i.hash for i in blocks}
+        for receipt in receipts:
+            if hashes.get(receipt.blockNumber) != receipt.blockHash:
+                logger.warning(f'交易 {receipt.transactionHash.hex()} 的 receipt 的 block_hash 与区块 '
+                               f'{receipt.blockNumber} 的 hash 不一致')
+                return receipt.blockNumber
+        return None
+
+    def check(self, web3, blocks, rpc_batch=100, receipts=()):
+        # blocks 为按高度排列的一个区间的区块，receipts 为这些区块中的交易的 receipts
+        # 链没有分叉时返回 None，否则返回分叉后的第一个区块高度
+        # 返回值不小于 blocks[0].number 时，说明本区间内的区块在获取期间发生了分叉，需要重新获取
+        for previous, block in zip(blocks, blocks[1:]):
+            if block.parentHash != previous.hash:
+                logger.warning(f'区块 {block.number} 的 parent_hash 与区块 {previous.number} 的 hash 不一致')
+                return block.number
+        fork = self.check_receipts(blocks, receipts)
+        if fork is not None:
+            return max(fork, blocks[0].number)
+        if not blocks:
+            return None
+        with self._lock:
+            parent_hash = self._hash(blocks[0].number - 1)
+        if parent_hash is None or parent_hash == blocks[0].parentHash.hex():
+            return None
+        fork = self.find_fork(web3, blocks[0].number - 1, rpc_batch)
+        # 已保存的区块仍在主链上，说明本区间是在分叉之前获取的
+        return blocks[0].number if fork is None else fork
+
+    def find_fork(self, web3, number, rpc_batch=100):
+        # 从节点获取窗口内 number 及以下的区块，返回第一个 hash 与已保存的不一致的高度，都一致时返回 None
+        with self._lock:
+            saved = self._conn.execute('SELECT number, hash FROM recent_blocks WHERE number <= ? ORDER BY number',
+                                       (number,)).fetchall()
+        canonical = {i.number: i.hash.hex()
+                     for i in get_blocks(web3, saved[0][0], number, full_transactions=False, batch_size=rpc_batch)}
+        fork = next((n for n, h in saved if canonical.get(n) != h), None)
+        if fork is None:
+            return None
+        if fork == saved[0][0]:
+            logger.error(f'分叉可能超出已保存的 {len(saved)} 个区块，只能重新输出其中的区块 {fork}~{number}')
+        logger.warning(f'检测到分叉，区块 {fork}~{number} 已不在主链上')
+        return fork
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,62 @@
+# -*- coding: UTF-8 -*-
+"""
+区块区间调度：把 [start, end) 切分成 batch 大小的区间，交给多个工作进程并行处理
+每个工作进程持有自己的 util.Web3 连接，输出文件的布局与单进程时相同
+"""
+import logging
+import multiprocessing
+from util import Web3
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(filename)s[line:%(lineno)d] - %(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+# 多进程时为共享的计数器，保存下一个待领取区间的起始高度
+_next_block = None
+
+
+def iter_ranges(config: dict):
+    # 遍历需要处理的区间 (start_block, end_block)
+    # 单进程时按顺序遍历；在工作进程中，每次从共享计数器领取下一个区间，直到超过 end
+    start, end, batch = config['start'], config['end'], config['batch']
+    if _next_block is None:
+        for start_block in range(start, end, batch):
+            yield start_block, start_block + batch - 1
+        return
+    while True:
+        with _next_block.get_lock():
+            start_block = _next_block.value
+            _next_block.value += batch
+        if start_block >= end:
+            return
+        yield start_block, start_block + batch - 1
+
+
+def connect(config: dict):
+    # 按配置创建 Web3 连接（连接池、检查节点落后程度的线程和 newHeads 订阅），在实际使用它的进程中调用
+    return Web3(config['ipc'], config['pool_size'], max_lag=config['max_lag'])
+
+
+def _work(export, config: dict, next_block):
+    global _next_block
+    _next_block = next_block
+    export(connect(config), config)
+
+
+def run(export, config: dict):
+    # export 为各模块的 export(web3, config)，其中通过 iter_ranges 遍历区间
+    # workers > 1 时启动多个工作进程，每个进程各自创建 Web3 连接，父进程不创建连接
+    workers = config['workers']
+    if workers <= 1:
+        return export(connect(config), config)
+
+    next_block = multiprocessing.Value('q', config['start'])
+    processes = [multiprocessing.Process(target=_work, args=(export, config, next_block)) for _ in range(workers)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    failed = [p.pid for p in processes if p.exitcode != 0]
+    if failed:
+        raise RuntimeError(f'工作进程 {failed} 异常退出')
+    logger.info(f'{workers} 个工作进程已完成')
@@ -0,0 +1,298 @@
+# -*- coding: UTF-8 -*-
+"""
+7 张表的 schema 登记：每一列记录一个逻辑类型，由逻辑类型决定 Arrow（parquet）中的类型和 Hive 中的类型
+- decimal：不超过 38 位的 uint256（如以 wei 计的 value、difficulty），DECIMAL(38,0)
+- uint256：任意的 uint256（如 token 的转账金额、total_supply），可能超过 DECIMAL(38,0) 的范围，
+  parquet 中保存为大端序的 32 字节 BINARY，csv 中仍为十进制字符串
+- hash、address、bytes：默认以 0x 开头的 hex 字符串保存；encoding = binary 时 parquet 中保存为原始字节
+  （hash 为 32 字节、address 为 20 字节），这些列的大小和扫描量减少一半；每行都不相同的列（如交易的 hash）
+  不使用字典编码，其他列（如 miner、address、token_address）使用字典编码
+逻辑类型保存在 parquet 的字段元数据中，csv 输出时据此转换回原来的文本，read_table 读取时转换回 hex 字符串
+运行 python schemas.py 按 config.ini 中的格式和布局重新生成 hive/*.sql
+"""
+import pyarrow as pa
+import pyarrow.parquet as pq
+import standards
+
+LOGICAL = b'logical_type'
+UNIQUE = b'unique'
+
+# 逻辑类型 -> (Arrow 类型, Hive 类型)
+TYPES = {
+    'int': (pa.int64(), 'BIGINT'),
+    'bool': (pa.bool_(), 'BOOLEAN'),
+    'string': (pa.string(), 'STRING'),
+    'decimal': (pa.decimal128(38, 0), 'DECIMAL(38,0)'),
+    'uint256': (pa.binary(32), 'BINARY'),
+    'hash': (pa.string(), 'STRING'),
+    'address': (pa.string(), 'STRING'),
+    'bytes': (pa.string(), 'STRING'),
+}
+
+# encoding = binary 时 hash、address、bytes 的类型
+BINARY_TYPES = {
+    'hash': (pa.binary(32), 'BINARY'),
+    'address': (pa.binary(20), 'BINARY'),
+    'bytes': (pa.binary(), 'BINARY'),
+}
+
+# 每行都不相同的列，encoding = binary 时不使用字典编码
+UNIQUE_COLUMNS = {
+    'blocks': {'hash', 'parent_hash', 'state_root'},
+    'transactions': {'hash'},
+    'receipts': {'transaction_hash'},
+}
+
+# hex 或 binary，由 set_encoding 设置
+encoding = 'hex'
+
+# 字段顺序与 *_to_dict 的输出一致
+TABLES = {
+    'blocks': [
+        ('number', 'int'),
+        ('hash', 'hash'),
+        ('parent_hash', 'hash'),
+        ('nonce', 'bytes'),
+        ('sha3_uncles', 'hash'),
+        ('logs_bloom', 'bytes'),
+        ('transactions_root', 'hash'),
+        ('state_root', 'hash'),
+        ('receipts_root', 'hash'),
+        ('miner', 'address'),
+        ('difficulty', 'decimal'),
+        ('total_difficulty', 'decimal'),
+        ('size', 'int'),
+        ('extra_data', 'bytes'),
+        ('gas_limit', 'int'),
+        ('gas_used', 'int'),
+        ('timestamp', 'int'),
+        ('transaction_count', 'int'),
+    ],
+    'transactions': [
+        ('hash', 'hash'),
+        ('nonce', 'int'),
+        ('block_hash', 'hash'),
+        ('block_number', 'int'),
+        ('transaction_index', 'int'),
+        ('from_address', 'address'),
+        ('to_address', 'address'),
+        ('value', 'decimal'),
+        ('gas', 'int'),
+        ('gas_price', 'int'),
+        ('input', 'bytes'),
+        ('block_timestamp', 'int'),
+    ],
+    'receipts': [
+        ('transaction_hash', 'hash'),
+        ('transaction_index', 'int'),
+        ('block_hash', 'hash'),
+        ('block_number', 'int'),
+        ('cumulative_gas_used', 'int'),
+        ('gas_used', 'int'),
+        ('contract_address', 'address'),
+        ('root', 'hash'),
+        ('status', 'int'),
+    ],
+    'logs': [
+        ('log_index', 'int'),
+        ('transaction_hash', 'hash'),
+        ('transaction_index', 'int'),
+        ('block_hash', 'hash'),
+        ('block_number', 'int'),
+        ('address', 'address'),
+        ('data', 'bytes'),
+        ('topic0', 'hash'),
+        ('topic1', 'hash'),
+        ('topic2', 'hash'),
+        ('topic3', 'hash'),
+    ],
+    'token_transfers': [
+        ('token_address', 'address'),
+        ('from_address', 'address'),
+        ('to_address', 'address'),
+        ('value', 'uint256'),
+        ('transaction_hash', 'hash'),
+        ('log_index', 'int'),
+        ('block_number', 'int'),
+    ],
+    # contracts 的 is_<标准名> 列由 standards 中登记的标准决定，见 get_columns
+    'contracts': [
+        ('address', 'address'),
+        ('bytecode', 'bytes'),
+        ('function_sighashes', 'string'),
+        ('block_number', 'int'),
+    ],
+    'tokens': [
+        ('address', 'address'),
+        ('symbol', 'string'),
+        ('name', 'string'),
+        ('decimals', 'int'),
+        ('total_supply', 'uint256'),
+        ('block_number', 'int'),
+    ],
+}
+
+
+def get_columns(table):
+    # [(列名, 逻辑类型), ...]
+    columns = TABLES[table]
+    if table == 'contracts':
+        columns = columns[:3] + [(f'is_{i}', 'bool') for i in standards.classifier.standards] + columns[3:]
+    return columns
+
+
+def set_encoding(value):
+    global encoding
+    encoding = value
+
+
+def get_type(logical):
+    # (Arrow 类型, Hive 类型)
+    if encoding == 'binary' and logical in BINARY_TYPES:
+        return BINARY_TYPES[logical]
+    return TYPES[logical]
+
+
+def make_schema(columns, unique=()):
+    # columns 为 [(列名, 逻辑类型), ...]，unique 为每行都不相同的列
+    fields = []
+    for name, logical in columns:
+        metadata = {LOGICAL: logical.encode()}
+        if name in unique:
+            metadata[UNIQUE] = b'1'
+        fields.append(pa.field(name, get_type(logical)[0], metadata=metadata))
+    return pa.schema(fields)
+
+
+def get_schema(table):
+    return make_schema(get_columns(table), UNIQUE_COLUMNS.get(table, ()))
+
+
+def logical_type(field):
+    return (field.metadata or {}).get(LOGICAL, b'').decode() or None
+
+
+def parquet_options(schema):
+    # ParquetWriter 的参数：encoding = binary 时每行都不相同的列直接保存，省去先建字典、超过大小后再回退的开销
+    # 其他列（包括 block_hash 等在一个文件中重复很多次的 hash）仍使用字典编码
+    if encoding != 'binary' or not any(logical_type(f) for f in schema):
+        return {}
+    return {'use_dictionary': [f.name for f in schema if not (f.metadata or {}).get(UNIQUE)]}
+
+
+def to_uint256(value):
+    # 十进制字符串、int 或 32 字节 -> 大端序的 32 字节
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        return bytes(value)
+    value = int(value)
+    return value.to_bytes(32, 'big') if 0 <= value < 1 << 256 else None
+
+
+def to_hex(value):
+    # HexBytes 等字节 -> 0x 开头的 hex 字符串，字符串保持不变
+    if isinstance(value, bytes):
+        return '0x' + bytes.hex(value)
+    return value
+
+
+def to_bytes(value):
+    # 0x 开头的 hex 字符串 -> 字节
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:])
+    return None if value is None else bytes(value)
+
+
+def get_encoder(logical):
+    if logical == 'uint256':
+        return to_uint256
+    if logical in BINARY_TYPES:
+        return to_bytes if encoding == 'binary' else to_hex
+    return None
+
+
+def to_array(values, field):
+    encoder = get_encoder(logical_type(field))
+    if encoder is not None:
+        values = [encoder(i) for i in values]
+    return pa.array(values, type=field.type)
+
+
+def to_table(schema, columns):
+    # columns 为与 schema 中的字段一一对应的 Python 值的 list
+    return pa.Table.from_arrays([to_array(c, f) for c, f in zip(columns, schema)], schema=schema)
+
+
+def rows_to_table(schema, rows):
+    # rows 为 dict 的 list，缺少的列为空
+    return to_table(schema, [[row.get(f.name) for row in rows] for f in schema])
+
+
+def to_text(values, field):
+    # 写入 csv 时把 Arrow 的值转换回原来的文本
+    logical = logical_type(field)
+    if logical == 'uint256':
+        return [None if i is None else str(int.from_bytes(i, 'big')) for i in values]
+    if logical in BINARY_TYPES and not pa.types.is_string(field.type):
+        return [to_hex(i) for i in values]
+    return values
+
+
+def decode(table):
+    # 把以字节保存的 hash、address、bytes 列转换回 hex 字符串，与 encoding = hex 时的输出相同
+    for i, field in enumerate(table.schema):
+        if logical_type(field) in BINARY_TYPES and not pa.types.is_string(field.type):
+            table = table.set_column(i, pa.field(field.name, pa.string(), metadata=field.metadata),
+                                     pa.array(to_text(table.column(i).to_pylist(), field), type=pa.string()))
+    return table
+
+
+def read_table(path, columns=None):
+    # 读取输出的 parquet 文件，不论以哪种 encoding 输出，hash、address、bytes 列都是 hex 字符串
+    return decode(pq.read_table(path, columns=columns))
+
+
+def hive_ddl(table, fmt='parquet', layout='flat', location='s3://<your_bucket>/ethereumetl/export'):
+    # 生成 Hive 建表语句；parquet 中按 Arrow 的类型读取，csv 中 uint256 为十进制字符串
+    columns = ',\n'.join(f'    {name} {"STRING" if fmt == "csv" and logical == "uint256" else get_type(logical)[1]}'
+                         for name, logical in get_columns(table))
+    lines = [f'CREATE EXTERNAL TABLE IF NOT EXISTS {table} (', columns, ')']
+    if layout == 'hive':
+        lines.append('PARTITIONED BY (start_block BIGINT)')
+    if fmt == 'parquet':
+        lines.append('STORED AS PARQUET')
+    else:
+        lines += ["ROW FORMAT SERDE 'org.apache.hadoop.hive.serde2.lazy.LazySimpleSerDe'",
+                  'WITH SERDEPROPERTIES (',
+                  "    'serialization.format' = ',',",
+                  "    'field.delim' = ',',",
+                  "    'escape.delim' = '\\\\'",
+                  ')',
+                  'STORED AS TEXTFILE']
+    lines.append(f"LOCATION '{location}/{table}'")
+    if fmt == 'csv':
+        lines += ['TBLPROPERTIES (', "  'skip.header.line.count' = '1'", ')']
+    lines[-1] += ';'
+    if layout == 'hive':
+        lines += ['', f'MSCK REPAIR TABLE {table};']
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import os
+    import configparser
+    from pathlib import Path
+
+    path_config = Path(__file__).parent / 'config.ini'
+    assert path_config.exists(), '配置文件 config.ini 不存在'
+    config = configparser.ConfigParser()
+    config.read(path_config)
+    if config.has_section('standards'):
+        standards.register_standards(dict(config['standards']))
+    set_encoding(config.get('output', 'encoding', fallback='hex'))
+    dir_hive = Path(__file__).parent / 'hive'
+    for table_name in TABLES:
+        with open(os.path.join(dir_hive, f'{table_name}.sql'), 'w') as f:
+            f.write(hive_ddl(table_name, config['output']['format'], config.get('output', 'layout', fallback='flat')))
+        print(f'{dir_hive / table_name}.sql')
@@ -0,0 +1,58 @@
+# -*- coding: UTF-8 -*-
+"""
+合约标准识别：预先计算每个标准的函数选择器集合，每个合约只需要与所有选择器求一次交集
+在 config.ini 的 [standards] 中可以新增标准，格式与 STANDARDS 相同，如
+    erc2981 = royaltyInfo(uint256,uint256); supportsInterface(bytes4)
+"""
+from eth_utils import function_signature_to_4byte_selector
+
+# 标准名 -> 必须实现的函数，用分号分隔；用竖线分隔的函数只需要实现其中之一
+STANDARDS = {
+    'erc20': 'totalSupply(); balanceOf(address); transfer(address,uint256); transferFrom(address,address,uint256); '
+             'approve(address,uint256); allowance(address,address)',
+    'erc721': 'balanceOf(address); ownerOf(uint256); '
+              'transfer(address,uint256) | transferFrom(address,address,uint256); approve(address,uint256)',
+    'erc1155': 'balanceOf(address,uint256); balanceOfBatch(address[],uint256[]); setApprovalForAll(address,bool); '
+               'isApprovedForAll(address,address); safeTransferFrom(address,address,uint256,uint256,bytes); '
+               'safeBatchTransferFrom(address,address,uint256[],uint256[],bytes)',
+    'erc777': 'name(); symbol(); granularity(); totalSupply(); balanceOf(address); send(address,uint256,bytes); '
+              'burn(uint256,bytes); isOperatorFor(address,address); authorizeOperator(address); '
+              'revokeOperator(address); defaultOperators(); operatorSend(address,address,uint256,bytes,bytes); '
+              'operatorBurn(address,uint256,bytes,bytes)',
+}
+
+
+def to_selector(signature):
+    return '0x' + function_signature_to_4byte_selector(signature.strip()).hex()
+
+
+class Classifier:
+    def __init__(self, standards: dict):
+        # 每个标准拆分为：必须全部实现的选择器集合 + 至少实现其一的选择器集合的列表
+        self.standards = {}
+        for name, spec in standards.items():
+            alternatives = [frozenset(to_selector(sig) for sig in item.split('|'))
+                            for item in spec.split(';') if item.strip()]
+            required = frozenset().union(*[i for i in alternatives if len(i) == 1])
+            any_of = [i for i in alternatives if len(i) > 1]
+            self.standards[name] = (required, any_of)
+        self.selectors = frozenset().union(*[required.union(*any_of) for required, any_of in self.standards.values()])
+
+    def classify(self, function_sig_hashes):
+        # 返回 {标准名: 是否实现}
+        found = self.selectors.intersection(function_sig_hashes)
+        return {name: required <= found and all(not i.isdisjoint(found) for i in any_of)
+                for name, (required, any_of) in self.standards.items()}
+
+
+classifier = Classifier(STANDARDS)
+
+
+def register_standards(standards: dict):
+    # 在默认标准的基础上加入（或覆盖）配置中的标准
+    global classifier
+    classifier = Classifier({**STANDARDS, **standards})
+
+
+def classify(function_sig_hashes):
+    return classifier.classify(function_sig_hashes)
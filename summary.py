@@ -6,44 +6,46 @@
 import web3
 import configparser
 from pathlib import Path
+from manifest import Manifest, MANIFEST_NAME
+from pool import endpoint_kind, make_provider
 
 # 读取并检查配置
 path_config = Path(__file__).parent / 'config.ini'
 assert path_config.exists(), '配置文件 config.ini 不存在'
 config = configparser.ConfigParser()
 config.read(path_config)
-path_ipc = config['geth']['ipc']
-assert Path(path_ipc).name == 'geth.ipc', 'geth.ipc 文件名错误'
-assert Path(path_ipc).exists(), f'geth.ipc 文件不存在：{path_ipc}'
+# 连接 web3，配置了多个节点时分别打印各节点的最新区块高度
+for path_ipc in [i.strip() for i in config['geth']['ipc'].split(',') if i.strip()]:
+    if endpoint_kind(path_ipc) == 'ipc':
+        assert Path(path_ipc).name == 'geth.ipc', 'geth.ipc 文件名错误'
+        assert Path(path_ipc).exists(), f'geth.ipc 文件不存在：{path_ipc}'
+    w3 = web3.Web3(make_provider(path_ipc, timeout=10))
+    assert w3.isConnected(), f'无法连接节点 {path_ipc}'
+    print(f'{path_ipc} 当前最新区块高度：{w3.eth.block_number}')
 
-# 连接 web3
-w3 = web3.Web3(web3.Web3.IPCProvider(path_ipc, timeout=10))
-assert w3.isConnected()
-print(f'当前最新区块高度：{w3.eth.block_number}')
 
-
-# DFS 获取最新区块高度
-def get_max_block_height(path: Path, table_name):
-    if not path.exists():
+# 从输出目录下的清单中读取进度，不需要遍历数据文件
+def print_progress(manifest: Manifest, table_name):
+    progress = manifest.progress().get(table_name)
+    if progress is None:
+        print(f'{table_name} 尚未处理')
         return
-    if path.is_file():
-        if path.suffix == '.csv' and path.name.startswith(table_name):
-            return int(path.stem.split('_')[-1])
-    elif path.is_dir():
-        max_height = 0
-        for p in path.iterdir():
-            height = get_max_block_height(p, table_name)
-            if height:
-                max_height = max(max_height, height)
-        return max_height
+    rows, speed = progress['rows'], progress['rows_per_second']
+    print(f'{table_name} 已处理到：{progress["max_block"]}，'
+          f'从 {progress["min_block"]} 开始共 {progress["files"]} 个文件、{rows if rows is not None else "未知"} 行，'
+          f'吞吐量：{f"{speed:.1f} 行/秒" if speed is not None else "未知"}')
+    gaps = manifest.gaps(table_name)
+    if gaps:
+        print(f'{table_name} 缺少 {len(gaps)} 个区间：' + ', '.join(f'{i}~{j}' for i, j in gaps[:20]) +
+              (' ...' if len(gaps) > 20 else ''))
 
 
 # 输出目录的绝对路径
 dir_output = Path(config['output']['path'])
 dir_output = dir_output if dir_output.is_absolute() else (Path(__file__).parent / dir_output)
+assert (dir_output / MANIFEST_NAME).exists(), f'{dir_output} 中没有 {MANIFEST_NAME}，旧版本的输出请先运行 python manifest.py'
+manifest = Manifest(str(dir_output))
 # 遍历
 for key in config['output'].keys():
     if key.startswith('table_name'):
-        t_name = config['output'][key]
-        path_data = dir_output / t_name
-        print(f'{t_name} 已处理到：{get_max_block_height(path_data, t_name)}')
+        print_progress(manifest, config['output'][key])
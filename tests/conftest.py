@@ -0,0 +1,6 @@
+# -*- coding: UTF-8 -*-
+# 脚本都在仓库根目录下，测试时把根目录加入 sys.path
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -0,0 +1,26 @@
+# -*- coding: UTF-8 -*-
+"""
+util.get_function_sig_hashes 与原来基于 ethereum_dasm 反汇编的实现等价
+fixtures/function_sig_hashes.json 中的 function_sig_hashes 由原来的实现生成，source 为 bytecode 的来源
+"""
+import json
+import pytest
+from pathlib import Path
+from util import get_function_sig_hashes
+
+CASES = json.loads((Path(__file__).parent / 'fixtures' / 'function_sig_hashes.json').read_text())
+
+
+@pytest.mark.parametrize('case', CASES, ids=[i['name'] for i in CASES])
+def test_matches_ethereum_dasm(case):
+    assert get_function_sig_hashes(case['bytecode']) == case['function_sig_hashes']
+
+
+@pytest.mark.parametrize('case', CASES, ids=[i['name'] for i in CASES])
+def test_without_prefix(case):
+    # eth_getCode 的结果和数据库中保存的 bytecode 可能没有 0x 前缀
+    assert get_function_sig_hashes(case['bytecode'][2:]) == case['function_sig_hashes']
+
+
+def test_none():
+    assert get_function_sig_hashes(None) == []
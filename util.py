@@ -5,15 +5,22 @@
 @Author  : zhangguanghui
 """
 import os
-import web3
-import json
+import csv
 import time
 import logging
-import pandas as pd
-from web3.middleware import geth_poa_middleware
-from web3.exceptions import BadFunctionCallOutput
-from ethereum_dasm.evmdasm import EvmCode, Contract
+import itertools
+import pyarrow as pa
+import pyarrow.parquet as pq
+from hexbytes import HexBytes
+from concurrent.futures import ThreadPoolExecutor
+from web3.datastructures import AttributeDict
+from web3.middleware.geth_poa import geth_poa_cleanup
+from web3._utils.method_formatters import block_formatter, receipt_formatter
 from eth_utils import function_signature_to_4byte_selector
+from heads import HeadWatcher
+from pool import Web3Pool, endpoint_kind
+from metrics import metrics
+from schemas import TABLES, get_schema, rows_to_table, to_text, parquet_options
 
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(filename)s[line:%(lineno)d] - %(levelname)s: %(message)s')
@@ -23,61 +30,171 @@ TOPIC_TRANSFER = '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523
 
 
 class Web3:
-    def __init__(self, ipc):
-        self.w3 = None
-        self.timeout = 600
-        self.ipc = ipc
-        assert os.path.exists(self.ipc), 'geth.ipc 路径 ' + self.ipc + ' 不存在'
-        self.update()
-
-    def update(self):
-        max_retry_count = 10
-        retry_count = 0
-        error_info = ''
-        while retry_count < max_retry_count:
-            try:
-                self.w3 = web3.Web3(web3.Web3.IPCProvider(self.ipc, timeout=self.timeout))
-                self.w3.middleware_onion.inject(geth_poa_middleware, layer=0)  # 注入 poa 兼容中间件到最内层
-                assert self.w3.isConnected()
-                return
-            except (Exception, AssertionError) as err:
-                retry_count += 1
-                logger.warning(f'Web3 初始化失败 {retry_count} 次：{str(err)}')
-                error_info = str(err)
-                time.sleep(60)
-
-        raise ValueError(f'Web3 初始化尝试次数超过最大重试次数 {max_retry_count}。' + error_info)
+    # 节点连接的入口：eth 接口和 batch_request 都从连接池中取连接，连接的健康状态由请求的成败得到
+    # ipc 可以是一个节点，也可以是多个节点的 list，请求按各节点的延迟和错误率分配
+    def __init__(self, ipc, pool_size=4, timeout=600, max_lag=5):
+        self.ipc = [ipc] if isinstance(ipc, str) else list(ipc)
+        self.timeout = timeout
+        for uri in self.ipc:
+            if endpoint_kind(uri) == 'ipc':
+                assert os.path.exists(uri), 'geth.ipc 路径 ' + uri + ' 不存在'
+        self.pool = Web3Pool(self.ipc, pool_size, timeout, max_lag=max_lag)
+        # 只在第一个 IPC 节点上订阅 newHeads，没有 IPC 节点时轮询 eth_blockNumber
+        ipc_paths = [i for i in self.ipc if endpoint_kind(i) == 'ipc']
+        self.heads = HeadWatcher(lambda: self.eth.blockNumber, ipc_paths[0] if ipc_paths else None)
+
+    @property
+    def w3(self):
+        return self.pool.pick().w3
 
     @property
     def eth(self):
-        if not self.w3.isConnected():
-            self.update()
         return self.w3.eth
 
-
-def export_data(table, data: list, path, fmt, compression=None):
-    df = pd.DataFrame(data)
-    if fmt == 'csv':
-        df.to_csv(path, index=False, encoding='utf-8-sig')
-    elif fmt == 'parquet':
-        df.to_parquet(path, index=False, compression=compression)
-    else:
-        raise TypeError(f'不支持的数据格式 {fmt}')
+    def checkout(self):
+        # 在工作线程中独占一个连接：with web3.checkout() as conn: conn.w3.eth...
+        return self.pool.checkout()
+
+    def batch_request(self, method, params_list):
+        # 在一个 JSON-RPC batch 中发送多个同名请求，按 params_list 的顺序返回各自的响应（含 result 或 error）
+        with self.pool.checkout() as conn:
+            return conn.batch_request(method, params_list)
+
+
+CHUNK_SIZE = 10000  # 写入文件时每个分块（parquet 的 row group）的行数
+
+
+def iter_chunks(data, chunk_size):
+    # 把可迭代对象按 chunk_size 切分成若干个 list
+    iterator = iter(data)
+    chunk = list(itertools.islice(iterator, chunk_size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(iterator, chunk_size))
+
+
+class TableWriter:
+    # 流式写入一张表：每次追加一个分块（dict 的 list 或 pyarrow.Table），不在内存中保留整个文件的数据
+    # 未指定 schema 时由第一个分块推断，全为空的列按字符串处理
+    def __init__(self, path, fmt, compression=None, schema=None):
+        if fmt not in ('csv', 'parquet'):
+            raise TypeError(f'不支持的数据格式 {fmt}')
+        self.path = path
+        # 先写入临时文件，close 时再原子地重命名，中途崩溃不会留下看似完整的文件
+        self.tmp_path = path + '.tmp'
+        self.fmt = fmt
+        self.compression = compression
+        self.schema = schema
+        self.rows = 0
+        self._file = None
+        self._writer = None
+        self._names = None
+
+    def _open_csv(self, names):
+        if self._writer is None:
+            self._names = list(names)
+            self._file = open(self.tmp_path, 'w', newline='', encoding='utf-8-sig')
+            self._writer = csv.writer(self._file, lineterminator='\n')
+            self._writer.writerow(self._names)
+
+    def _open_parquet(self, schema):
+        if self._writer is None:
+            self.schema = self.schema or pa.schema([pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f
+                                                    for f in schema])
+            self._writer = pq.ParquetWriter(self.tmp_path, self.schema, compression=self.compression or 'none',
+                                            **parquet_options(self.schema))
+
+    def write_rows(self, rows: list):
+        if not rows:
+            return
+        if self.fmt == 'csv':
+            self._open_csv(self.schema.names if self.schema else rows[0].keys())
+            self._writer.writerows([[row.get(k) for k in self._names] for row in rows])
+            self.rows += len(rows)
+        else:
+            self.write_table(pa.Table.from_pylist(rows, schema=self.schema))
+
+    def write_table(self, table: pa.Table):
+        if table.num_rows == 0:
+            return
+        if self.fmt == 'csv':
+            self._open_csv(table.schema.names)
+            self._writer.writerows(zip(*[to_text(c.to_pylist(), f) for c, f in zip(table.columns, table.schema)]))
+        else:
+            self._open_parquet(table.schema)
+            self._writer.write_table(table.select(self.schema.names).cast(self.schema), row_group_size=table.num_rows)
+        self.rows += table.num_rows
+
+    def close(self):
+        if self._writer is None:
+            # 没有数据时也输出一个空文件，以便 continue 时跳过
+            if self.fmt == 'csv':
+                self._open_csv(self.schema.names if self.schema else [])
+                self._file.close()
+            else:
+                empty = self.schema.empty_table() if self.schema else pa.table({})
+                pq.write_table(empty, self.tmp_path, compression=self.compression or 'none')
+        elif self._file is not None:
+            self._file.close()
+        else:
+            self._writer.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        # 出错时丢弃临时文件，不覆盖已有的文件
+        if self._file is not None:
+            self._file.close()
+        elif self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def export_data(table, data, path, fmt, compression=None, chunk_size=CHUNK_SIZE):
+    # data 可以是 dict 的 list、生成器或 pyarrow.Table，按 chunk_size 分块写入
+    # 只有生成器在写入时逐块生成，dict 的 list 和 pyarrow.Table 本身已经是整个 batch 的数据
+    # 返回写入的行数；data 为生成器时，生成数据的耗时也计入 write 阶段
+    # schemas.py 中登记过的表按登记的 schema 转换，其他表由第一个分块推断 schema
+    with metrics.timer('write', table=table):
+        if isinstance(data, pa.Table):
+            with TableWriter(path, fmt, compression, schema=data.schema) as writer:
+                for batch in data.to_batches(max_chunksize=chunk_size):
+                    writer.write_table(pa.Table.from_batches([batch], schema=data.schema))
+        elif table in TABLES:
+            schema = get_schema(table)
+            with TableWriter(path, fmt, compression, schema=schema) as writer:
+                for chunk in iter_chunks(data, chunk_size):
+                    writer.write_table(rows_to_table(schema, chunk))
+        else:
+            with TableWriter(path, fmt, compression) as writer:
+                for chunk in iter_chunks(data, chunk_size):
+                    writer.write_rows(chunk)
+    metrics.inc('rows_total', writer.rows, table=table)
+    metrics.inc('bytes_total', os.path.getsize(path), table=table)
     logger.info(f'{table} -> {path}')
+    return writer.rows
 
 
-def wait_until_reach(w3, start_block: int, batch: int):
-    # 等待到达最新区块高度
-    current_block_index = w3.eth.blockNumber
-    while current_block_index < start_block + batch:
-        logger.info(f'待开始区块 {start_block}，当前最新区块 {current_block_index}，差值小于 {batch}，等待 60 秒')
-        time.sleep(60)
-        current_block_index = w3.eth.blockNumber
+def wait_until_reach(w3, start_block: int, batch: int, confirmations: int = 1):
+    # 等待最新区块高度达到区间的最后一个区块之后 confirmations 个区块，新区块由 HeadWatcher 通知或轮询得到
+    w3.heads.wait_for(start_block + batch - 1 + confirmations)
 
 
-def get_path(output, table, start_block, end_block, fmt):
-    # 创建目录
+def get_path(output, table, start_block, end_block, fmt, partition_size=None):
+    # 创建目录；指定 partition_size 时按 Hive 的分区目录输出，如 blocks/start_block=1000000/
+    # 分区的值为区间起始高度向下取整到 partition_size 的整数倍，一个分区包含多个文件，可以再由 compact.py 合并
     dir_blocks = os.path.join(output, table)
+    if partition_size:
+        dir_blocks = os.path.join(dir_blocks, partition_name(start_block, partition_size))
     os.makedirs(dir_blocks, exist_ok=True)
     if fmt == 'csv':
         suffix = '.csv'
@@ -89,6 +206,10 @@ def get_path(output, table, start_block, end_block, fmt):
     return path_blocks
 
 
+def partition_name(start_block, partition_size):
+    return f'start_block={start_block // partition_size * partition_size}'
+
+
 def to_normalized_address(address):
     if address is None or not isinstance(address, str):
         return address
@@ -104,21 +225,119 @@ def word_to_address(param):
         return to_normalized_address(param)
 
 
-def get_logs(w3, start, end):
+def fetch_logs(w3, start, end, topics=None, addresses=None):
+    # 直接调用 eth_getLogs 获取 [start, end] 区间内的 logs，不在节点上创建 filter，只请求一次，失败时直接抛出异常
+    # topics 为 topic0 的候选列表，addresses 为合约地址列表，为空表示不过滤，过滤在节点上完成
+    filter_params = {
+        'fromBlock': start,
+        'toBlock': end,
+    }
+    if topics:
+        filter_params['topics'] = [list(topics)]
+    if addresses:
+        filter_params['address'] = list(addresses)
+    return w3.eth.get_logs(filter_params)
+
+
+def get_logs(w3, start, end, topics=None, addresses=None):
+    # 失败时按指数退避重试：1, 2, 4, ... 秒，最长 60 秒
     try_max_cnt = 30
     try_index = 0
     error_info = ''
     while try_index < try_max_cnt:
         try:
-            return w3.eth.filter({
-                'fromBlock': start,
-                'toBlock': end,
-            }).get_all_entries()
+            return fetch_logs(w3, start, end, topics, addresses)
         except Exception as err:
+            error_info = str(err)
+            metrics.inc('rpc_retries_total', method='eth_getLogs')
+            time.sleep(min(2 ** try_index, 60))
             try_index += 1
+    raise ValueError(f'在 {start}-{end} 获取 logs 失败，超过最大尝试次数 {try_max_cnt}。' + error_info)
+
+
+class LogFetcher:
+    # 自适应窗口获取 logs：窗口请求失败或结果过多时二分，结果较少时翻倍，窗口大小在多次调用之间保留
+    # 只有单个区块的窗口仍然失败时，才通过 get_logs 指数退避重试
+    def __init__(self, w3, window=10, max_window=2000, target=5000, topics=None, addresses=None):
+        self.w3 = w3
+        self.window = window
+        self.max_window = max_window
+        self.target = target
+        self.topics = topics
+        self.addresses = addresses
+
+    def get_logs(self, start, end):
+        logs = []
+        from_block = start
+        while from_block <= end:
+            to_block = min(from_block + self.window - 1, end)
+            try:
+                entries = fetch_logs(self.w3, from_block, to_block, self.topics, self.addresses)
+            except Exception as err:
+                if to_block > from_block:
+                    metrics.inc('rpc_retries_total', method='eth_getLogs')
+                    self.window = max((to_block - from_block + 1) // 2, 1)
+                    logger.info(f'获取 {from_block}-{to_block} 的 logs 失败，窗口缩小为 {self.window}：{str(err)}')
+                    continue
+                entries = get_logs(self.w3, from_block, to_block, self.topics, self.addresses)
+            logs.extend(entries)
+            from_block = to_block + 1
+            if len(entries) > self.target:
+                self.window = max(self.window // 2, 1)
+            elif len(entries) < self.target // 4:
+                self.window = min(self.window * 2, self.max_window)
+        return logs
+
+
+# eth_call 在 EVM 中执行失败的错误信息，重试也不会成功
+VM_ERRORS = ('revert', 'invalid opcode', 'out of gas', 'stack underflow', 'stack limit reached',
+             'invalid jump destination', 'write protection', 'return data out of bounds')
+
+
+def is_vm_error(error):
+    # geth 对 revert 返回 code 3，其他 EVM 错误只能根据错误信息判断
+    if not isinstance(error, dict):
+        return False
+    return error.get('code') == 3 or any(i in str(error.get('message', '')).lower() for i in VM_ERRORS)
+
+
+def batch_call(w3, method, params_list, formatter, allow_errors=False):
+    # 带重试的 batch 请求：任一请求出错或返回空结果，则整批重试
+    # 如果 allow_errors=True，revert 等 EVM 错误的请求返回 None；节点的临时错误（如 header not found、限流、超时）
+    # 仍然整批重试，不会被当作没有结果
+    max_retry_count = 30
+    retry_count = 0
+    error_info = ''
+    while retry_count < max_retry_count:
+        try:
+            responses = w3.batch_request(method, params_list)
+            errors = [r.get('error') or f'{method}{params_list[r["id"]]} 返回空结果'
+                      for r in responses if r.get('result') is None]
+            assert len(responses) == len(params_list), f'{method} batch 响应数量不一致'
+            errors = [i for i in errors if not (allow_errors and is_vm_error(i))]
+            assert not errors, errors and errors[0]
+            return [None if r.get('result') is None else formatter(r['result']) for r in responses]
+        except (Exception, AssertionError) as err:
+            retry_count += 1
             error_info = str(err)
+            metrics.inc('rpc_retries_total', method=method)
             time.sleep(3)
-    raise ValueError(f'在 {start}-{end} 获取 logs 失败，超过最大尝试次数 {try_max_cnt}。' + error_info)
+
+    raise ValueError(f'{method} batch 请求失败次数超过最大重试次数 {max_retry_count}。' + error_info)
+
+
+def format_block(block):
+    # 与 web3.eth.get_block 的返回格式保持一致（包括 poa 中间件的 proofOfAuthorityData 字段）
+    return AttributeDict.recursive(block_formatter(geth_poa_cleanup(block)))
+
+
+def get_blocks(w3, start, end, full_transactions=False, batch_size=100):
+    # 批量获取 [start, end] 区间内的区块，每个 batch 最多包含 batch_size 个 eth_getBlockByNumber 请求
+    blocks = []
+    for i in range(start, end + 1, batch_size):
+        params_list = [[hex(j), full_transactions] for j in range(i, min(i + batch_size - 1, end) + 1)]
+        blocks.extend(batch_call(w3, 'eth_getBlockByNumber', params_list, format_block))
+    return blocks
 
 
 def get_receipt(w3, tx_hash):
@@ -131,20 +350,34 @@ def get_receipt(w3, tx_hash):
         except (Exception, AssertionError) as err:
             retry_count += 1
             error_info = str(err)
+            metrics.inc('rpc_retries_total', method='eth_getTransactionReceipt')
             time.sleep(3)
 
     raise ValueError(f'获取 receipt 失败次数超过最大重试次数 {max_retry_count}。' + error_info)
 
 
-def call_contract_function2(func, ignore_errors, default_value=None):
+def format_receipt(receipt):
+    # 与 web3.eth.getTransactionReceipt 的返回格式保持一致
+    return AttributeDict.recursive(receipt_formatter(receipt))
+
+
+def get_receipts_batch(w3, tx_hashes):
+    # 在一个 batch 中获取多个 receipt，失败或为空的 receipt 再逐个通过 get_receipt 重试
     try:
-        result = func.call()
-        return result
-    except Exception as ex:
-        if type(ex) in ignore_errors:
-            print('An exception occurred in function {} of contract {}. '.format(func.fn_name, func.address)
-                  + 'This exception can be safely ignored.')
-        return default_value
+        responses = w3.batch_request('eth_getTransactionReceipt', [[i] for i in tx_hashes])
+        assert len(responses) == len(tx_hashes)
+    except (Exception, AssertionError) as err:
+        logger.warning(f'receipt batch 请求失败，逐个重试：{str(err)}')
+        responses = [{} for _ in tx_hashes]
+    return [format_receipt(r['result']) if r.get('result') is not None else get_receipt(w3, tx_hash)
+            for r, tx_hash in zip(responses, tx_hashes)]
+
+
+def get_receipts(w3, tx_hashes, batch_size=100, workers=4):
+    # 用有界线程池并发获取 receipts，每个线程的 batch 使用独立的 IPC 连接，返回顺序与 tx_hashes 一致
+    chunks = [tx_hashes[i:i + batch_size] for i in range(0, len(tx_hashes), batch_size)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(itertools.chain.from_iterable(executor.map(lambda c: get_receipts_batch(w3, c), chunks)))
 
 
 ASCII_0 = 0
@@ -160,57 +393,30 @@ def clean_user_provided_content(content):
         return content
 
 
-def call_contract_function1(func):
-    # BadFunctionCallOutput exception happens if the token doesn't implement a particular function
-    # or was self-destructed
-    # OverflowError exception happens if the return type of the function doesn't match the expected type
-    result = call_contract_function2(
-        func=func,
-        ignore_errors=(BadFunctionCallOutput, OverflowError, ValueError),
-        default_value=None)
-    return clean_user_provided_content(result)
-
-
-def get_first_result(*funcs):
-    for func in funcs:
-        result = call_contract_function1(func)
-        if result is not None:
-            return result
-    return None
-
-
 def get_function_sig_hash(signature):
     return '0x' + function_signature_to_4byte_selector(signature).hex()
 
 
-class ContractWrapper:
-    def __init__(self, sig_hashes):
-        self.sig_hashes = sig_hashes
-
-    def implements(self, function_signature):
-        sig_hash = get_function_sig_hash(function_signature)
-        return sig_hash in self.sig_hashes
-
-    def implements_any_of(self, *function_signatures):
-        return any(self.implements(function_signature) for function_signature in function_signatures)
-
-
-def is_erc20_contract(function_sig_hashes):
-    c: ContractWrapper = ContractWrapper(function_sig_hashes)
-    return c.implements('totalSupply()') and \
-           c.implements('balanceOf(address)') and \
-           c.implements('transfer(address,uint256)') and \
-           c.implements('transferFrom(address,address,uint256)') and \
-           c.implements('approve(address,uint256)') and \
-           c.implements('allowance(address,address)')
+def decode_call_result(w3, output_type, result):
+    # 调用 revert 或返回值无法解码（如合约没有该函数、返回类型不符）时返回 None
+    if result is None:
+        return None
+    try:
+        return clean_user_provided_content(w3.w3.codec.decode_abi([output_type], result)[0])
+    except Exception:
+        return None
 
 
-def is_erc721_contract(function_sig_hashes):
-    c = ContractWrapper(function_sig_hashes)
-    return c.implements('balanceOf(address)') and \
-           c.implements('ownerOf(uint256)') and \
-           c.implements_any_of('transfer(address,uint256)', 'transferFrom(address,address,uint256)') and \
-           c.implements('approve(address,uint256)')
+def call_contract_functions(w3, calls, batch_size=100):
+    # 在 JSON-RPC batch 中执行多个无参数的只读函数，calls 为 [(合约地址, 函数签名, 返回类型)]，结果与 calls 顺序一致
+    results = []
+    for i in range(0, len(calls), batch_size):
+        chunk = calls[i:i + batch_size]
+        params_list = [[{'to': address, 'data': get_function_sig_hash(signature)}, 'latest']
+                       for address, signature, _ in chunk]
+        responses = batch_call(w3, 'eth_call', params_list, HexBytes, allow_errors=True)
+        results.extend(decode_call_result(w3, output_type, r) for (_, _, output_type), r in zip(chunk, responses))
+    return results
 
 
 def clean_bytecode(bytecode):
@@ -222,285 +428,31 @@ def clean_bytecode(bytecode):
         return bytecode
 
 
+OPCODE_PUSH1, OPCODE_PUSH4, OPCODE_PUSH32, OPCODE_JUMPDEST = 0x60, 0x63, 0x7f, 0x5b
+
+
 def get_function_sig_hashes(bytecode):
+    # 线性扫描 bytecode，收集第一个 JUMPDEST（即第一个基本块结束）之前所有 PUSH4 的操作数，也就是函数选择器
+    # PUSHn 的立即数会被跳过；末尾不完整的 PUSH4 不计入，与 ethereum_dasm 反汇编的结果一致
     bytecode = clean_bytecode(bytecode)
-    if bytecode is not None:
-        evm_code = EvmCode(contract=Contract(bytecode=bytecode), static_analysis=False, dynamic_analysis=False)
-        evm_code.disassemble(bytecode)
-        basic_blocks = evm_code.basicblocks
-        if basic_blocks and len(basic_blocks) > 0:
-            init_block = basic_blocks[0]
-            instructions = init_block.instructions
-            push4_instructions = [inst for inst in instructions if inst.name == 'PUSH4']
-            return sorted(list(set('0x' + inst.operand for inst in push4_instructions)))
-        else:
-            return []
-    else:
+    if bytecode is None:
         return []
+    code = bytes.fromhex(bytecode)
+    size = len(code)
+    sig_hashes = set()
+    pc = 0
+    while pc < size:
+        opcode = code[pc]
+        if opcode == OPCODE_JUMPDEST:
+            break
+        if OPCODE_PUSH1 <= opcode <= OPCODE_PUSH32:
+            if opcode == OPCODE_PUSH4 and pc + 5 <= size:
+                sig_hashes.add('0x' + code[pc + 1:pc + 5].hex())
+            pc += opcode - OPCODE_PUSH1 + 1
+        pc += 1
+    return sorted(sig_hashes)
 
 
-ERC20_ABI = json.loads('''
-[
-    {
-        "constant": true,
-        "inputs": [],
-        "name": "name",
-        "outputs": [
-            {
-                "name": "",
-                "type": "string"
-            }
-        ],
-        "payable": false,
-        "stateMutability": "view",
-        "type": "function"
-    },
-    {
-        "constant": false,
-        "inputs": [
-            {
-                "name": "_spender",
-                "type": "address"
-            },
-            {
-                "name": "_value",
-                "type": "uint256"
-            }
-        ],
-        "name": "approve",
-        "outputs": [
-            {
-                "name": "",
-                "type": "bool"
-            }
-        ],
-        "payable": false,
-        "stateMutability": "nonpayable",
-        "type": "function"
-    },
-    {
-        "constant": true,
-        "inputs": [],
-        "name": "totalSupply",
-        "outputs": [
-            {
-                "name": "",
-                "type": "uint256"
-            }
-        ],
-        "payable": false,
-        "stateMutability": "view",
-        "type": "function"
-    },
-    {
-        "constant": false,
-        "inputs": [
-            {
-                "name": "_from",
-                "type": "address"
-            },
-            {
-                "name": "_to",
-                "type": "address"
-            },
-            {
-                "name": "_value",
-                "type": "uint256"
-            }
-        ],
-        "name": "transferFrom",
-        "outputs": [
-            {
-                "name": "",
-                "type": "bool"
-            }
-        ],
-        "payable": false,
-        "stateMutability": "nonpayable",
-        "type": "function"
-    },
-    {
-        "constant": true,
-        "inputs": [],
-        "name": "decimals",
-        "outputs": [
-            {
-                "name": "",
-                "type": "uint8"
-            }
-        ],
-        "payable": false,
-        "stateMutability": "view",
-        "type": "function"
-    },
-    {
-        "constant": true,
-        "inputs": [
-            {
-                "name": "_owner",
-                "type": "address"
-            }
-        ],
-        "name": "balanceOf",
-        "outputs": [
-            {
-                "name": "",
-                "type": "uint256"
-            }
-        ],
-        "payable": false,
-        "stateMutability": "view",
-        "type": "function"
-    },
-    {
-        "constant": true,
-        "inputs": [],
-        "name": "symbol",
-        "outputs": [
-            {
-                "name": "",
-                "type": "string"
-            }
-        ],
-        "payable": false,
-        "stateMutability": "view",
-        "type": "function"
-    },
-    {
-        "constant": false,
-        "inputs": [
-            {
-                "name": "_to",
-                "type": "address"
-            },
-            {
-                "name": "_value",
-                "type": "uint256"
-            }
-        ],
-        "name": "transfer",
-        "outputs": [
-            {
-                "name": "",
-                "type": "bool"
-            }
-        ],
-        "payable": false,
-        "stateMutability": "nonpayable",
-        "type": "function"
-    },
-    {
-        "constant": true,
-        "inputs": [
-            {
-                "name": "_owner",
-                "type": "address"
-            },
-            {
-                "name": "_spender",
-                "type": "address"
-            }
-        ],
-        "name": "allowance",
-        "outputs": [
-            {
-                "name": "",
-                "type": "uint256"
-            }
-        ],
-        "payable": false,
-        "stateMutability": "view",
-        "type": "function"
-    },
-    {
-        "anonymous": false,
-        "inputs": [
-            {
-                "indexed": true,
-                "name": "_from",
-                "type": "address"
-            },
-            {
-                "indexed": true,
-                "name": "_to",
-                "type": "address"
-            },
-            {
-                "indexed": false,
-                "name": "_value",
-                "type": "uint256"
-            }
-        ],
-        "name": "Transfer",
-        "type": "event"
-    },
-    {
-        "anonymous": false,
-        "inputs": [
-            {
-                "indexed": true,
-                "name": "_owner",
-                "type": "address"
-            },
-            {
-                "indexed": true,
-                "name": "_spender",
-                "type": "address"
-            },
-            {
-                "indexed": false,
-                "name": "_value",
-                "type": "uint256"
-            }
-        ],
-        "name": "Approval",
-        "type": "event"
-    },
-    {
-        "constant": true,
-        "inputs": [],
-        "name": "NAME",
-        "outputs": [
-            {
-                "name": "",
-                "type": "string"
-            }
-        ],
-        "payable": false,
-        "stateMutability": "view",
-        "type": "function"
-    },
-    {
-        "constant": true,
-        "inputs": [],
-        "name": "SYMBOL",
-        "outputs": [
-            {
-                "name": "",
-                "type": "string"
-            }
-        ],
-        "payable": false,
-        "stateMutability": "view",
-        "type": "function"
-    },
-    {
-        "constant": true,
-        "inputs": [],
-        "name": "DECIMALS",
-        "outputs": [
-            {
-                "name": "",
-                "type": "uint8"
-            }
-        ],
-        "payable": false,
-        "stateMutability": "view",
-        "type": "function"
-    }
-]
-''')
-
 if __name__ == '__main__':
     # import web3
 